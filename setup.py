@@ -0,0 +1,11 @@
+"""Build the optional compiled accelerator; all other metadata is in setup.cfg."""
+import platform
+from setuptools import Extension, setup
+
+ext_modules = []
+if platform.python_implementation() == 'CPython':
+    # optional: if it fails to build, the package falls back on the pure-ctypes implementation
+    ext_modules.append(Extension('energymon._speedups', sources=['src/energymon/_speedups.c'],
+                                 optional=True))
+
+setup(ext_modules=ext_modules)
@@ -0,0 +1,264 @@
+/**
+ * Optional accelerator for reading an energymon.
+ *
+ * Functions take the address of a populated energymon struct and its fread function pointer
+ * (as Python ints), avoiding the ctypes FFI overhead on each read.
+ * See energymon/accel.py for the public API and the pure-ctypes fallback.
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <errno.h>
+#include <stdint.h>
+#include <string.h>
+#ifdef _WIN32
+#include <windows.h>
+#else
+#include <time.h>
+#endif
+
+typedef uint64_t (*energymon_read_total)(const void* em);
+
+static uint64_t now_ns(void) {
+#ifdef _WIN32
+  LARGE_INTEGER freq, count;
+  QueryPerformanceFrequency(&freq);
+  QueryPerformanceCounter(&count);
+  return (uint64_t) ((double) count.QuadPart * 1000000000.0 / (double) freq.QuadPart);
+#else
+  struct timespec ts;
+  clock_gettime(CLOCK_MONOTONIC, &ts);
+  return (uint64_t) ts.tv_sec * 1000000000ULL + (uint64_t) ts.tv_nsec;
+#endif
+}
+
+static void sleep_ns(uint64_t ns) {
+#ifdef _WIN32
+  Sleep((DWORD) (ns / 1000000));
+#else
+  struct timespec req, rem;
+  req.tv_sec = (time_t) (ns / 1000000000ULL);
+  req.tv_nsec = (long) (ns % 1000000000ULL);
+  while (nanosleep(&req, &rem) != 0 && errno == EINTR) {
+    req = rem;
+  }
+#endif
+}
+
+static int get_pointers(unsigned long long em, unsigned long long fread,
+                        const void** em_ptr, energymon_read_total* fread_ptr) {
+  if (!em || !fread) {
+    PyErr_SetString(PyExc_ValueError, "NULL energymon or 'fread' pointer");
+    return -1;
+  }
+  *em_ptr = (const void*) (uintptr_t) em;
+  *fread_ptr = (energymon_read_total) (uintptr_t) fread;
+  return 0;
+}
+
+PyDoc_STRVAR(read_doc,
+"read(em, fread)\n--\n\n"
+"Read the total energy in microjoules.\n"
+"``em`` and ``fread`` are the struct address and function pointer as ints.\n"
+"Raises OSError if the read fails.");
+
+static PyObject* speedups_read(PyObject* self, PyObject* args) {
+  unsigned long long em, fread;
+  const void* em_ptr;
+  energymon_read_total fread_ptr;
+  uint64_t val;
+  int err;
+  (void) self;
+  if (!PyArg_ParseTuple(args, "KK:read", &em, &fread) ||
+      get_pointers(em, fread, &em_ptr, &fread_ptr)) {
+    return NULL;
+  }
+  errno = 0;
+  val = fread_ptr(em_ptr);
+  err = errno;
+  if (val == 0 && err != 0) {
+    errno = err;
+    return PyErr_SetFromErrno(PyExc_OSError);
+  }
+  return PyLong_FromUnsignedLongLong(val);
+}
+
+PyDoc_STRVAR(sample_doc,
+"sample(em, fread, buf, period_ns=0, timestamps=None)\n--\n\n"
+"Fill a writable buffer of uint64 values with readings taken every ``period_ns``\n"
+"nanoseconds, without holding the GIL.\n"
+"If ``timestamps`` is a writable buffer, it is filled with int64 monotonic clock values in\n"
+"nanoseconds.\n"
+"Returns the number of readings. Raises OSError if a read fails.");
+
+static PyObject* speedups_sample(PyObject* self, PyObject* args, PyObject* kwargs) {
+  static char* kwlist[] = {"em", "fread", "buf", "period_ns", "timestamps", NULL};
+  unsigned long long em, fread, period_ns = 0;
+  PyObject* ts_obj = Py_None;
+  Py_buffer buf, ts;
+  const void* em_ptr;
+  energymon_read_total fread_ptr;
+  Py_ssize_t n, i;
+  uint64_t val, t, next;
+  char* out;
+  char* ts_out = NULL;
+  int err = 0;
+  (void) self;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "KKw*|KO:sample", kwlist,
+                                   &em, &fread, &buf, &period_ns, &ts_obj)) {
+    return NULL;
+  }
+  if (get_pointers(em, fread, &em_ptr, &fread_ptr)) {
+    PyBuffer_Release(&buf);
+    return NULL;
+  }
+  if (buf.len % 8) {
+    PyBuffer_Release(&buf);
+    PyErr_SetString(PyExc_ValueError, "buffer size must be a multiple of 8 bytes");
+    return NULL;
+  }
+  n = buf.len / 8;
+  if (ts_obj != Py_None) {
+    if (PyObject_GetBuffer(ts_obj, &ts, PyBUF_WRITABLE) != 0) {
+      PyBuffer_Release(&buf);
+      return NULL;
+    }
+    if (ts.len < buf.len) {
+      PyBuffer_Release(&ts);
+      PyBuffer_Release(&buf);
+      PyErr_SetString(PyExc_ValueError, "timestamps buffer is smaller than buffer");
+      return NULL;
+    }
+    ts_out = (char*) ts.buf;
+  }
+  out = (char*) buf.buf;
+
+  Py_BEGIN_ALLOW_THREADS
+  next = now_ns();
+  for (i = 0; i < n; i++) {
+    if (period_ns && i) {
+      next += period_ns;
+      t = now_ns();
+      if (next > t) {
+        sleep_ns(next - t);
+      } else {
+        // running behind - don't try to catch up with a burst of reads
+        next = t;
+      }
+    }
+    errno = 0;
+    val = fread_ptr(em_ptr);
+    err = errno;
+    if (val == 0 && err != 0) {
+      break;
+    }
+    memcpy(out + i * 8, &val, 8);
+    if (ts_out) {
+      t = now_ns();
+      memcpy(ts_out + i * 8, &t, 8);
+    }
+  }
+  Py_END_ALLOW_THREADS
+
+  if (ts_out) {
+    PyBuffer_Release(&ts);
+  }
+  PyBuffer_Release(&buf);
+  if (i < n) {
+    errno = err;
+    return PyErr_SetFromErrno(PyExc_OSError);
+  }
+  return PyLong_FromSsize_t(n);
+}
+
+PyDoc_STRVAR(read_many_doc,
+"read_many(pointers)\n--\n\n"
+"Read multiple energymons without holding the GIL.\n"
+"``pointers`` is a sequence of ``(em, fread)`` int pairs.\n"
+"Returns a list of readings. Raises OSError if any read fails.");
+
+static PyObject* speedups_read_many(PyObject* self, PyObject* arg) {
+  PyObject* seq;
+  PyObject* result = NULL;
+  const void** ems = NULL;
+  energymon_read_total* freads = NULL;
+  uint64_t* vals = NULL;
+  Py_ssize_t n, i;
+  int err = 0;
+  (void) self;
+  seq = PySequence_Fast(arg, "read_many() argument must be a sequence");
+  if (seq == NULL) {
+    return NULL;
+  }
+  n = PySequence_Fast_GET_SIZE(seq);
+  ems = PyMem_Malloc((size_t) (n ? n : 1) * sizeof(*ems));
+  freads = PyMem_Malloc((size_t) (n ? n : 1) * sizeof(*freads));
+  vals = PyMem_Malloc((size_t) (n ? n : 1) * sizeof(*vals));
+  if (!ems || !freads || !vals) {
+    PyErr_NoMemory();
+    goto done;
+  }
+  for (i = 0; i < n; i++) {
+    unsigned long long em, fread;
+    if (!PyArg_ParseTuple(PySequence_Fast_GET_ITEM(seq, i), "KK:read_many", &em, &fread) ||
+        get_pointers(em, fread, &ems[i], &freads[i])) {
+      goto done;
+    }
+  }
+
+  Py_BEGIN_ALLOW_THREADS
+  for (i = 0; i < n; i++) {
+    errno = 0;
+    vals[i] = freads[i](ems[i]);
+    err = errno;
+    if (vals[i] == 0 && err != 0) {
+      break;
+    }
+  }
+  Py_END_ALLOW_THREADS
+
+  if (i < n) {
+    errno = err;
+    PyErr_SetFromErrno(PyExc_OSError);
+    goto done;
+  }
+  result = PyList_New(n);
+  if (result == NULL) {
+    goto done;
+  }
+  for (i = 0; i < n; i++) {
+    PyObject* val = PyLong_FromUnsignedLongLong(vals[i]);
+    if (val == NULL) {
+      Py_CLEAR(result);
+      goto done;
+    }
+    PyList_SET_ITEM(result, i, val);
+  }
+
+done:
+  PyMem_Free(vals);
+  PyMem_Free(freads);
+  PyMem_Free(ems);
+  Py_DECREF(seq);
+  return result;
+}
+
+static PyMethodDef speedups_methods[] = {
+  {"read", speedups_read, METH_VARARGS, read_doc},
+  {"sample", (PyCFunction) (void(*)(void)) speedups_sample, METH_VARARGS | METH_KEYWORDS,
+   sample_doc},
+  {"read_many", speedups_read_many, METH_O, read_many_doc},
+  {NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef speedups_module = {
+  PyModuleDef_HEAD_INIT,
+  "energymon._speedups",
+  "Optional accelerator for reading an energymon.",
+  -1,
+  speedups_methods,
+  NULL, NULL, NULL, NULL
+};
+
+PyMODINIT_FUNC PyInit__speedups(void) {
+  return PyModule_Create(&speedups_module);
+}
@@ -0,0 +1,268 @@
+"""
+Accelerated reads of an ``energymon``.
+
+When the optional compiled ``_speedups`` module is built, reads call the native ``fread``
+function pointer directly rather than through ``ctypes``, and sampling loops and batched reads
+run without holding the GIL.
+Otherwise, these functions fall back on ``util``, with the same behavior.
+
+Resolving the struct and function pointers through ``ctypes`` costs more than a ``ctypes``
+read, so direct reads are only accelerated by a ``Reader`` (or a ``MultiReader``), which
+resolves them once; ``read_uj`` is a convenience for occasional reads.
+"""
+from ctypes import addressof, c_void_p, cast
+from functools import partial
+import time
+from typing import Callable, List, Sequence, Tuple
+from . import energymon, util
+
+try:
+    from . import _speedups
+except ImportError:
+    _speedups = None
+
+AVAILABLE = _speedups is not None
+"""bool: True if the compiled accelerator is available, False otherwise."""
+
+if hasattr(time, 'monotonic_ns'):
+    _monotonic_ns = time.monotonic_ns
+else: # Python < 3.7
+    def _monotonic_ns() -> int:
+        return int(time.monotonic() * 1000000000)
+
+def _pointers(em: energymon) -> Tuple[int, int]:
+    if not em.fread:
+        raise ValueError('\'fread\' not set - did you \'get\' the energymon?')
+    return addressof(em), cast(em.fread, c_void_p).value
+
+def _sample_fallback(em: energymon, buf, period_ns: int, timestamps) -> int:
+    out = memoryview(buf).cast('B')
+    if out.nbytes % 8:
+        raise ValueError('buffer size must be a multiple of 8 bytes')
+    out = out.cast('Q')
+    ts_out = None
+    if timestamps is not None:
+        ts_out = memoryview(timestamps).cast('B')
+        if ts_out.nbytes < out.nbytes:
+            raise ValueError('timestamps buffer is smaller than buffer')
+        ts_out = ts_out[:out.nbytes].cast('q')
+    next_ns = _monotonic_ns()
+    for i in range(len(out)):
+        if period_ns and i:
+            next_ns += period_ns
+            now = _monotonic_ns()
+            if next_ns > now:
+                time.sleep((next_ns - now) / 1000000000)
+            else:
+                # running behind - don't try to catch up with a burst of reads
+                next_ns = now
+        out[i] = util.get_uj(em)
+        if ts_out is not None:
+            ts_out[i] = _monotonic_ns()
+    return len(out)
+
+def _read_fallback(em: energymon) -> int:
+    # look up util.get_uj per call so instrumentation still applies
+    return util.get_uj(em)
+
+def read_uj(em: energymon) -> int:
+    """
+    Get the total energy in microjoules.
+
+    Equivalent to ``util.get_uj``, which it always uses: for accelerated repeated reads, use a
+    ``Reader``.
+
+    Parameters
+    ----------
+    em : energymon
+        The ``energymon`` must be initialized.
+
+    Returns
+    -------
+    int
+        The total energy in microjoules.
+
+    Raises
+    ------
+    OSError
+        If the underlying function returns an error.
+    """
+    return util.get_uj(em)
+
+def sample_uj(em: energymon, buf, period_us: int=0, timestamps=None) -> int:
+    """
+    Fill a buffer with readings taken at a target period.
+
+    With the accelerator, the loop runs without holding the GIL, so it cannot be interrupted
+    (e.g., by ``KeyboardInterrupt``) until the buffer is full.
+
+    Parameters
+    ----------
+    em : energymon
+        The ``energymon`` must be initialized.
+    buf : writable buffer
+        The buffer for readings, interpreted as native-endian ``uint64`` values, e.g., an
+        ``array.array('Q')`` or ``bytearray``; its size determines the number of readings.
+    period_us : int, optional
+        The target period in microseconds between readings (0 reads as fast as possible).
+    timestamps : writable buffer, optional
+        A buffer of at least the same size, filled with ``int64`` monotonic clock values in
+        nanoseconds taken after each reading, e.g., an ``array.array('q')``.
+
+    Returns
+    -------
+    int
+        The number of readings.
+
+    Raises
+    ------
+    OSError
+        If the underlying function returns an error; earlier readings are retained in ``buf``.
+    ValueError
+        If a buffer size is invalid.
+    """
+    if _speedups is not None:
+        em_ptr, fread_ptr = _pointers(em)
+        return _speedups.sample(em_ptr, fread_ptr, buf, period_us * 1000, timestamps)
+    return _sample_fallback(em, buf, period_us * 1000, timestamps)
+
+def read_many_uj(ems: Sequence[energymon]) -> List[int]:
+    """
+    Get the total energy in microjoules from multiple ``energymon`` instances.
+
+    With the accelerator, all reads are made in a single call without holding the GIL.
+
+    Parameters
+    ----------
+    ems : Sequence[energymon]
+        The ``energymon`` instances, which must be initialized.
+
+    Returns
+    -------
+    List[int]
+        The total energy readings in microjoules.
+
+    Raises
+    ------
+    OSError
+        If any underlying function returns an error.
+    """
+    if _speedups is None:
+        return [util.get_uj(em) for em in ems]
+    return _speedups.read_many([_pointers(em) for em in ems])
+
+
+class Reader:
+    """
+    Repeated accelerated reads of one ``energymon``, with its pointers resolved only once.
+
+    The ``energymon`` must remain initialized, and must not be re-populated by a "getter"
+    function, while the reader is in use; the reader keeps a reference to it.
+
+    Attributes
+    ----------
+    em : energymon
+        The ``energymon``.
+    read : Callable[[], int]
+        Get the total energy in microjoules, like ``read_uj``; raises ``OSError`` if the
+        underlying function returns an error.
+        With the accelerator, this calls straight into the compiled module.
+    """
+
+    def __init__(self, em: energymon):
+        """
+        Create a new instance.
+
+        Parameters
+        ----------
+        em : energymon
+            The ``energymon``, which must be populated by a "getter" function.
+
+        Raises
+        ------
+        ValueError
+            If the ``energymon`` is not populated.
+        """
+        self.em = em
+        self._pointers = _pointers(em)
+        if _speedups is None:
+            self.read = partial(_read_fallback, em) # type: Callable[[], int]
+        else:
+            self.read = partial(_speedups.read, *self._pointers)
+
+    def sample(self, buf, period_us: int=0, timestamps=None) -> int:
+        """
+        Fill a buffer with readings taken at a target period, like ``sample_uj``.
+
+        Parameters
+        ----------
+        buf : writable buffer
+            The buffer for readings, interpreted as native-endian ``uint64`` values.
+        period_us : int, optional
+            The target period in microseconds between readings (0 reads as fast as possible).
+        timestamps : writable buffer, optional
+            A buffer of at least the same size, filled with ``int64`` monotonic clock values
+            in nanoseconds taken after each reading.
+
+        Returns
+        -------
+        int
+            The number of readings.
+
+        Raises
+        ------
+        OSError
+            If the underlying function returns an error; earlier readings are retained.
+        ValueError
+            If a buffer size is invalid.
+        """
+        if _speedups is None:
+            return _sample_fallback(self.em, buf, period_us * 1000, timestamps)
+        return _speedups.sample(self._pointers[0], self._pointers[1], buf, period_us * 1000,
+                                timestamps)
+
+
+class MultiReader:
+    """
+    Repeated accelerated reads of multiple ``energymon`` instances, with their pointers
+    resolved only once.
+
+    The same constraints as for ``Reader`` apply to each ``energymon``.
+    """
+
+    def __init__(self, ems: Sequence[energymon]):
+        """
+        Create a new instance.
+
+        Parameters
+        ----------
+        ems : Sequence[energymon]
+            The ``energymon`` instances, which must be populated by a "getter" function.
+
+        Raises
+        ------
+        ValueError
+            If an ``energymon`` is not populated.
+        """
+        self.ems = tuple(ems)
+        self._pointers = tuple(_pointers(em) for em in self.ems)
+
+    def read(self) -> List[int]:
+        """
+        Get the total energy in microjoules from each ``energymon``.
+
+        With the accelerator, all reads are made in a single call without holding the GIL.
+
+        Returns
+        -------
+        List[int]
+            The total energy readings in microjoules, in order.
+
+        Raises
+        ------
+        OSError
+            If any underlying function returns an error.
+        """
+        if _speedups is None:
+            return [util.get_uj(em) for em in self.ems]
+        return _speedups.read_many(self._pointers)
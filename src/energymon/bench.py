@@ -0,0 +1,302 @@
+"""
+Scaling benchmark for concurrent energy sampling.
+
+Consumers (threads or asyncio tasks sharing one ``EnergyMon``, or processes with one
+``EnergyMon`` each) read energy concurrently at increasing concurrency levels, reporting
+throughput, read latency percentiles, CPU overhead, and sample integrity.
+
+By default, reads are served by a stepped ``replay`` backend over a generated counter trace,
+in which every read returns the next integer; any lost or duplicated samples then indicate
+a concurrency bug in the read path.
+Integrity checks are not reported for real backends, which legitimately repeat values within
+a refresh interval.
+
+Run as a program, e.g.::
+
+    python -m energymon.bench --modes threads,asyncio --levels 1,2,4,8 --json results.json
+"""
+import argparse
+import asyncio
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from .context import EnergyMon
+from .replay import ReplayEnergyMon
+
+MODES = ('threads', 'asyncio', 'processes')
+"""The supported concurrency modes."""
+
+Backend = namedtuple('Backend', ['lib', 'func_get', 'trace'])
+Backend.__doc__ = """
+The energymon backend for a benchmark; if ``trace`` is set, a stepped replay of it is used.
+
+Attributes
+----------
+lib : str
+    The library name.
+func_get : str
+    The native "getter" function name.
+trace : Optional[str]
+    The path to a counter trace.
+"""
+
+def write_counter_trace(path: str, samples: int) -> None:
+    """
+    Write a trace whose readings are ``1, 2, ..., samples``.
+
+    Parameters
+    ----------
+    path : str
+        The trace file path.
+    samples : int
+        The number of samples.
+    """
+    with open(path, 'w') as trace:
+        trace.write('# source: energymon.bench counter\n')
+        trace.writelines('{} {}\n'.format(i, i) for i in range(1, samples + 1))
+
+def _create(backend: Backend) -> EnergyMon:
+    if backend.trace is not None:
+        return ReplayEnergyMon(backend.trace, stepped=True)
+    return EnergyMon(lib=backend.lib, func_get=backend.func_get)
+
+def _consume(em: EnergyMon, reads: int) -> Tuple[List[float], List[int]]:
+    latencies = []
+    values = []
+    perf_counter = time.perf_counter
+    for _ in range(reads):
+        start = perf_counter()
+        values.append(em.get_uj())
+        latencies.append(perf_counter() - start)
+    return latencies, values
+
+async def _consume_async(em: EnergyMon, reads: int) -> Tuple[List[float], List[int]]:
+    latencies = []
+    values = []
+    perf_counter = time.perf_counter
+    for _ in range(reads):
+        start = perf_counter()
+        values.append(em.get_uj())
+        latencies.append(perf_counter() - start)
+        # yield to other tasks between reads
+        await asyncio.sleep(0)
+    return latencies, values
+
+def _process_consumer(backend: Backend,
+                      reads: int) -> Tuple[List[float], List[int], float, float]:
+    with _create(backend) as em:
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        latencies, values = _consume(em, reads)
+        return latencies, values, time.perf_counter() - start, time.process_time() - cpu_start
+
+def _percentile(sorted_vals: Sequence[float], p: float) -> float:
+    if not sorted_vals:
+        return float('nan')
+    idx = min(len(sorted_vals) - 1, max(0, int(round(p / 100 * len(sorted_vals))) - 1))
+    return sorted_vals[idx]
+
+def _integrity(values_lists: List[List[int]], shared: bool) -> Tuple[int, int]:
+    # with a counter trace, n reads of a monitor should return exactly 1..n - across all
+    # consumers if the monitor is shared, otherwise per consumer
+    groups = [[v for values in values_lists for v in values]] if shared else values_lists
+    lost = 0
+    duplicates = 0
+    for values in groups:
+        unique = set(values)
+        duplicates += len(values) - len(unique)
+        lost += len(set(range(1, len(values) + 1)) - unique)
+    return lost, duplicates
+
+def run_level(mode: str, level: int, reads: int, backend: Backend) -> Dict[str, object]:
+    """
+    Run one benchmark configuration.
+
+    Parameters
+    ----------
+    mode : str
+        The concurrency mode: ``'threads'``, ``'asyncio'``, or ``'processes'``.
+    level : int
+        The number of concurrent consumers.
+    reads : int
+        The number of reads per consumer.
+    backend : Backend
+        The energymon backend.
+
+    Returns
+    -------
+    Dict[str, object]
+        The results: ``mode``, ``level``, ``reads``, ``throughput_rps``, ``p50_us``,
+        ``p99_us``, ``cpu_overhead`` (CPU time per wall-clock time), and ``lost`` and
+        ``duplicates`` (None unless using a counter trace).
+    """
+    if mode not in MODES:
+        raise ValueError('Unknown mode: ' + mode)
+    if level < 1:
+        raise ValueError('level must be >= 1')
+    results = [] # type: List[Tuple[List[float], List[int]]]
+    if mode == 'processes':
+        with ProcessPoolExecutor(level) as executor:
+            futures = [executor.submit(_process_consumer, backend, reads) for _ in range(level)]
+            outs = [fut.result() for fut in futures]
+        results = [(lat, vals) for lat, vals, _, _ in outs]
+        # workers run concurrently, so the slowest bounds the wall-clock time
+        wall_s = max(out[2] for out in outs)
+        cpu_s = sum(out[3] for out in outs)
+    else:
+        with _create(backend) as em:
+            cpu_start = time.process_time()
+            start = time.perf_counter()
+            if mode == 'threads':
+                results = [([], [])] * level
+                barrier = threading.Barrier(level)
+
+                def _run(idx):
+                    barrier.wait()
+                    results[idx] = _consume(em, reads)
+
+                threads = [threading.Thread(target=_run, args=(i,)) for i in range(level)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            else:
+                async def _gather():
+                    return await asyncio.gather(*[_consume_async(em, reads)
+                                                  for _ in range(level)])
+                loop = asyncio.new_event_loop()
+                try:
+                    results = loop.run_until_complete(_gather())
+                finally:
+                    loop.close()
+            wall_s = time.perf_counter() - start
+            cpu_s = time.process_time() - cpu_start
+    latencies = sorted(lat for lats, _ in results for lat in lats)
+    total = len(latencies)
+    lost, duplicates = None, None
+    if backend.trace is not None:
+        lost, duplicates = _integrity([vals for _, vals in results], mode != 'processes')
+    return {
+        'mode': mode,
+        'level': level,
+        'reads': total,
+        'throughput_rps': total / wall_s if wall_s > 0 else float('nan'),
+        'p50_us': _percentile(latencies, 50) * 1000000,
+        'p99_us': _percentile(latencies, 99) * 1000000,
+        'cpu_overhead': cpu_s / wall_s if wall_s > 0 else float('nan'),
+        'lost': lost,
+        'duplicates': duplicates,
+    }
+
+def sweep(modes: Sequence[str]=MODES, levels: Sequence[int]=(1, 2, 4, 8),
+          reads: int=1000, backend: Optional[Backend]=None) -> List[Dict[str, object]]:
+    """
+    Run the benchmark over modes and concurrency levels.
+
+    Parameters
+    ----------
+    modes : Sequence[str], optional
+        The concurrency modes.
+    levels : Sequence[int], optional
+        The concurrency levels.
+    reads : int, optional
+        The number of reads per consumer.
+    backend : Backend, optional
+        The energymon backend, default: a generated counter trace.
+
+    Returns
+    -------
+    List[Dict[str, object]]
+        The results of ``run_level`` for each configuration.
+    """
+    if backend is not None:
+        return [run_level(mode, level, reads, backend) for mode in modes for level in levels]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        trace = os.path.join(tmpdir, 'counter.txt')
+        write_counter_trace(trace, reads * max(levels))
+        backend = Backend('energymon-default', 'energymon_get_default', trace)
+        return [run_level(mode, level, reads, backend) for mode in modes for level in levels]
+
+def format_table(results: Sequence[Dict[str, object]]) -> str:
+    """
+    Format results as a text table, with throughput scaling relative to level 1 of each mode.
+
+    Parameters
+    ----------
+    results : Sequence[Dict[str, object]]
+        Results from ``sweep`` or ``run_level``.
+
+    Returns
+    -------
+    str
+        The table.
+    """
+    header = ('mode', 'level', 'reads/s', 'scaling', 'p50 us', 'p99 us', 'cpu', 'lost', 'dup')
+    rows = [header]
+    base = {} # type: Dict[object, float]
+    for res in results:
+        if res['level'] == 1:
+            base[res['mode']] = res['throughput_rps']
+    for res in results:
+        scaling = res['throughput_rps'] / base[res['mode']] if base.get(res['mode']) else None
+        rows.append((
+            str(res['mode']), str(res['level']), '{:.0f}'.format(res['throughput_rps']),
+            '-' if scaling is None else '{:.2f}x'.format(scaling),
+            '{:.1f}'.format(res['p50_us']), '{:.1f}'.format(res['p99_us']),
+            '{:.2f}'.format(res['cpu_overhead']),
+            '-' if res['lost'] is None else str(res['lost']),
+            '-' if res['duplicates'] is None else str(res['duplicates']),
+        ))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    return '\n'.join('  '.join(col.rjust(w) for col, w in zip(row, widths)) for row in rows)
+
+def main(argv: Optional[Sequence[str]]=None) -> int:
+    """
+    Run the benchmark from the command line.
+
+    Parameters
+    ----------
+    argv : Sequence[str], optional
+        The arguments, default: ``sys.argv[1:]``.
+
+    Returns
+    -------
+    int
+        The exit status: 1 if any lost or duplicate samples were detected, otherwise 0.
+    """
+    parser = argparse.ArgumentParser(prog='python -m energymon.bench', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='threads,asyncio,processes',
+                        help='comma-separated concurrency modes (default: %(default)s)')
+    parser.add_argument('--levels', default='1,2,4,8',
+                        help='comma-separated concurrency levels (default: %(default)s)')
+    parser.add_argument('--reads', type=int, default=1000,
+                        help='reads per consumer (default: %(default)s)')
+    parser.add_argument('--lib', help='use a real energymon library instead of a counter trace')
+    parser.add_argument('--func-get', default='energymon_get_default',
+                        help='the getter function for --lib (default: %(default)s)')
+    parser.add_argument('--json', help='write JSON results to a file (\'-\' for stdout)')
+    args = parser.parse_args(argv)
+    modes = [m for m in args.modes.split(',') if m]
+    levels = [int(l) for l in args.levels.split(',') if l]
+    backend = None if args.lib is None else Backend(args.lib, args.func_get, None)
+    results = sweep(modes, levels, args.reads, backend)
+    if args.json == '-':
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        if args.json:
+            with open(args.json, 'w') as out:
+                json.dump(results, out, indent=2)
+        print(format_table(results))
+    return int(any(res['lost'] or res['duplicates'] for res in results))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,338 @@
+"""
+Per-cgroup and per-process energy estimation on top of a node-level ``EnergyMon``.
+
+Each tick samples the node energy together with the CPU usage of each tracked cgroup
+(``cpu.stat`` ``usage_usec`` under cgroup v2) or process (``utime + stime`` from
+``/proc/<pid>/stat``).
+The energy consumed in the interval is split into an idle (baseline) share, estimated from a
+configured idle power, and a dynamic share, which is apportioned in proportion to CPU usage
+relative to the node-wide CPU usage (from ``/proc/stat``).
+The dynamic energy of CPU time used by anything not tracked is reported as unattributed.
+
+Usage files are opened once and re-read with ``os.pread``, and only the needed fields are
+parsed, so hundreds of cgroups can be sampled per tick.
+This module requires a POSIX system.
+"""
+from collections import namedtuple
+import errno
+import os
+import time
+from typing import Callable, Dict, List, Optional, Union
+
+Key = Union[str, int]
+
+Tick = namedtuple('Tick', ['interval_s', 'energy_uj', 'idle_uj', 'unattributed_uj', 'shares',
+                           'removed'])
+Tick.__doc__ = """
+The energy estimate for one interval.
+
+Attributes
+----------
+interval_s : float
+    The interval duration in seconds.
+energy_uj : int
+    The node energy consumed in the interval, in microjoules.
+idle_uj : float
+    The idle (baseline) share of the energy, in microjoules.
+unattributed_uj : float
+    The dynamic share of the energy not attributed to any tracked cgroup or process (i.e.,
+    for CPU time used by untracked cgroups, processes, or the kernel), in microjoules.
+    If tracked cgroups or processes overlap, it is a lower bound.
+shares : Dict[Union[str, int], float]
+    The dynamic energy attributed to each tracked cgroup (by path) or process (by pid), in
+    microjoules.
+    Each is independent of the others, so a process in a tracked cgroup is charged both
+    individually and as part of the cgroup.
+removed : List[Union[str, int]]
+    Cgroups or processes that disappeared and are no longer tracked.
+"""
+
+_READ_SIZE = 4096
+_USAGE_USEC = b'usage_usec '
+
+def parse_cpu_stat(data: bytes) -> int:
+    """
+    Parse the ``usage_usec`` value from cgroup v2 ``cpu.stat`` contents.
+
+    Parameters
+    ----------
+    data : bytes
+        The file contents.
+
+    Returns
+    -------
+    int
+        The CPU usage in microseconds.
+
+    Raises
+    ------
+    ValueError
+        If the value is not found.
+    """
+    start = data.find(_USAGE_USEC)
+    if start < 0:
+        raise ValueError('usage_usec not found in cpu.stat')
+    start += len(_USAGE_USEC)
+    end = data.find(b'\n', start)
+    return int(data[start:end] if end >= 0 else data[start:])
+
+def parse_proc_cpu_stat(data: bytes, ticks_per_s: int) -> int:
+    """
+    Parse the node-wide busy CPU time from ``/proc/stat`` contents.
+
+    Busy time is the sum of the ``user``, ``nice``, ``system``, ``irq``, and ``softirq``
+    fields of the aggregate ``cpu`` line (``guest`` time is included in ``user``).
+
+    Parameters
+    ----------
+    data : bytes
+        The file contents.
+    ticks_per_s : int
+        Clock ticks per second (``SC_CLK_TCK``).
+
+    Returns
+    -------
+    int
+        The CPU usage in microseconds, summed over all CPUs.
+
+    Raises
+    ------
+    ValueError
+        If the ``cpu`` line is not found.
+    """
+    if not data.startswith(b'cpu '):
+        raise ValueError('cpu line not found in stat')
+    fields = data[4:data.find(b'\n')].split()
+    busy = int(fields[0]) + int(fields[1]) + int(fields[2]) + int(fields[5]) + int(fields[6])
+    return busy * 1000000 // ticks_per_s
+
+def parse_proc_stat(data: bytes, ticks_per_s: int) -> int:
+    """
+    Parse the CPU time (``utime + stime``) from ``/proc/<pid>/stat`` contents.
+
+    Parameters
+    ----------
+    data : bytes
+        The file contents.
+    ticks_per_s : int
+        Clock ticks per second (``SC_CLK_TCK``).
+
+    Returns
+    -------
+    int
+        The CPU usage in microseconds.
+    """
+    # the command name may contain spaces and parentheses, so parse after the last ')'
+    fields = data[data.rindex(b')') + 2:].split(None, 13)
+    return (int(fields[11]) + int(fields[12])) * 1000000 // ticks_per_s
+
+
+class _Source:
+    """An open usage file for a cgroup or process."""
+
+    __slots__ = ('fd', 'parse', 'last_us')
+
+    def __init__(self, path: str, parse: Callable[[bytes], int]):
+        self.fd = os.open(path, os.O_RDONLY)
+        self.parse = parse
+        self.last_us = None # type: Optional[int]
+
+    def read_us(self) -> int:
+        return self.parse(os.pread(self.fd, _READ_SIZE, 0))
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class CgroupEnergyEstimator:
+    """
+    Estimates the energy consumption of cgroups and processes from a node-level monitor.
+
+    The first call to ``tick`` establishes a baseline; subsequent calls return estimates for
+    the interval since the previous tick.
+    Cgroups or processes that disappear are dropped and reported in ``Tick.removed``.
+    Use as a context manager (or call ``close()``) to close the usage files.
+    """
+
+    def __init__(self, em, cgroups: List[str]=(), pids: List[int]=(),
+                 idle_power_w: float=0.0, cgroup_root: str='/sys/fs/cgroup',
+                 proc_root: str='/proc', clock: Callable[[], float]=time.monotonic):
+        """
+        Create a new instance.
+
+        Parameters
+        ----------
+        em : EnergyMon
+            The node-level energy monitor, which must be initialized before ticking.
+        cgroups : List[str], optional
+            Cgroup paths relative to ``cgroup_root`` to track.
+        pids : List[int], optional
+            Process IDs to track.
+        idle_power_w : float, optional
+            The node's idle (baseline) power in Watts, which is not apportioned.
+        cgroup_root : str, optional
+            The cgroup v2 mount point.
+        proc_root : str, optional
+            The proc filesystem mount point, for process and node-wide CPU usage.
+        clock : Callable[[], float], optional
+            The clock, in seconds, used to measure intervals.
+        """
+        self.em = em
+        self.idle_power_w = idle_power_w
+        self.cgroup_root = cgroup_root
+        self.proc_root = proc_root
+        self.clock = clock
+        self.totals = {} # type: Dict[Key, float]
+        self._ticks_per_s = os.sysconf('SC_CLK_TCK')
+        self._sources = {} # type: Dict[Key, _Source]
+        self._last_uj = None # type: Optional[int]
+        self._last_s = 0.0
+        ticks_per_s = self._ticks_per_s
+        self._node = _Source(os.path.join(proc_root, 'stat'),
+                             lambda data: parse_proc_cpu_stat(data, ticks_per_s))
+        try:
+            for cgroup in cgroups:
+                self.add_cgroup(cgroup)
+            for pid in pids:
+                self.add_pid(pid)
+        except BaseException:
+            self.close()
+            raise
+
+    @property
+    def tracked(self) -> List[Key]:
+        """List[Union[str, int]]: The tracked cgroup paths and process IDs."""
+        return list(self._sources)
+
+    def add_cgroup(self, cgroup: str) -> None:
+        """
+        Track a cgroup.
+
+        Parameters
+        ----------
+        cgroup : str
+            The cgroup path relative to the cgroup root.
+
+        Raises
+        ------
+        OSError
+            If the cgroup's ``cpu.stat`` file cannot be opened.
+        """
+        path = os.path.join(self.cgroup_root, cgroup.strip('/'), 'cpu.stat')
+        self._add(cgroup, _Source(path, parse_cpu_stat))
+
+    def add_pid(self, pid: int) -> None:
+        """
+        Track a process.
+
+        Parameters
+        ----------
+        pid : int
+            The process ID.
+
+        Raises
+        ------
+        OSError
+            If the process's ``stat`` file cannot be opened.
+        """
+        ticks_per_s = self._ticks_per_s
+        path = os.path.join(self.proc_root, str(pid), 'stat')
+        self._add(pid, _Source(path, lambda data: parse_proc_stat(data, ticks_per_s)))
+
+    def _add(self, key: Key, source: _Source) -> None:
+        old = self._sources.pop(key, None)
+        if old is not None:
+            old.close()
+        self._sources[key] = source
+        self.totals.setdefault(key, 0.0)
+
+    def remove(self, key: Key) -> None:
+        """
+        Stop tracking a cgroup or process.
+
+        Parameters
+        ----------
+        key : Union[str, int]
+            The cgroup path or process ID.
+
+        Raises
+        ------
+        KeyError
+            If not tracked.
+        """
+        self._sources.pop(key).close()
+
+    def tick(self) -> Optional[Tick]:
+        """
+        Sample energy and CPU usage and estimate energy for the interval since the last tick.
+
+        Returns
+        -------
+        Optional[Tick]
+            The estimate, or None on the first tick (or if the energy counter decreased, e.g.,
+            because the monitor was reinitialized).
+
+        Raises
+        ------
+        ValueError
+            If closed.
+        """
+        if self._node is None:
+            raise ValueError('estimator is closed')
+        now_s = self.clock()
+        uj = self.em.get_uj()
+        node_us = self._node.read_us()
+        last_node_us = self._node.last_us
+        self._node.last_us = node_us
+        deltas = {} # type: Dict[Key, int]
+        removed = [] # type: List[Key]
+        for key, source in self._sources.items():
+            try:
+                usage_us = source.read_us()
+            except OSError as err:
+                # ENODEV for removed cgroups, ESRCH for exited processes
+                if err.errno not in (errno.ENODEV, errno.ESRCH, errno.ENOENT):
+                    raise
+                removed.append(key)
+                continue
+            if source.last_us is not None:
+                deltas[key] = max(0, usage_us - source.last_us)
+            source.last_us = usage_us
+        for key in removed:
+            self.remove(key)
+
+        last_uj, last_s = self._last_uj, self._last_s
+        self._last_uj, self._last_s = uj, now_s
+        if last_uj is None or uj < last_uj:
+            return None
+        energy_uj = uj - last_uj
+        interval_s = now_s - last_s
+        idle_uj = min(float(energy_uj), max(0.0, self.idle_power_w * interval_s * 1000000))
+        dynamic_uj = energy_uj - idle_uj
+        node_delta_us = max(0, node_us - last_node_us) if last_node_us is not None else 0
+        # /proc/stat has clock tick granularity, so a tracked cgroup's usage may slightly exceed
+        # the node's; never charge more than the dynamic energy to any one cgroup or process
+        total_us = max(node_delta_us, max(deltas.values(), default=0))
+        shares = dict.fromkeys(deltas, 0.0) # type: Dict[Key, float]
+        if total_us > 0:
+            for key, delta_us in deltas.items():
+                share = dynamic_uj * delta_us / total_us
+                shares[key] = share
+                self.totals[key] = self.totals.get(key, 0.0) + share
+        unattributed_uj = max(0.0, dynamic_uj - sum(shares.values()))
+        return Tick(interval_s, energy_uj, idle_uj, unattributed_uj, shares, removed)
+
+    def close(self) -> None:
+        """Close all usage files and stop tracking."""
+        for source in self._sources.values():
+            source.close()
+        self._sources.clear()
+        if self._node is not None:
+            self._node.close()
+            self._node = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,310 @@
+"""
+Discovery of the best available ``energymon`` library on a host.
+
+Candidate libraries are probed concurrently (load, "get", init, read, and finish), ranked, and
+the decision is cached on disk keyed by a host fingerprint so later runs can skip probing.
+``discover`` keeps the winning candidate initialized, so callers don't pay its init twice.
+"""
+from collections import namedtuple
+import hashlib
+import json
+import os
+import platform
+import threading
+import time
+from typing import List, Optional, Sequence, Tuple
+from .context import EnergyMon
+
+ProbeResult = namedtuple('ProbeResult', ['lib', 'func_get', 'ok', 'error', 'source',
+                                         'interval_us', 'precision_uj', 'latency_s'])
+ProbeResult.__doc__ = """
+The result of probing a candidate.
+
+Attributes
+----------
+lib : str
+    The library name.
+func_get : str
+    The native "getter" function name.
+ok : bool
+    True if the candidate is usable, False otherwise.
+error : Optional[str]
+    A description of the failure if not ``ok``.
+source : Optional[str]
+    The energy monitoring source.
+interval_us : Optional[int]
+    The refresh interval in microseconds.
+precision_uj : Optional[int]
+    The read precision in microjoules (0 if unknown).
+latency_s : Optional[float]
+    The mean read latency in seconds.
+"""
+
+DEFAULT_CANDIDATES = (('energymon-default', 'energymon_get_default'),)
+"""The default candidates: the ``energymon-default`` library."""
+
+def host_fingerprint() -> str:
+    """
+    Get a fingerprint of the host and its hardware, used as the discovery cache key.
+
+    Returns
+    -------
+    str
+        A hex digest.
+    """
+    parts = [platform.node(), platform.system(), platform.release(), platform.machine()]
+    try:
+        with open('/proc/cpuinfo', 'r') as cpuinfo:
+            for line in cpuinfo:
+                if line.startswith('model name'):
+                    parts.append(line.split(':', 1)[1].strip())
+                    break
+    except OSError:
+        pass
+    return hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+
+def default_cache_path() -> str:
+    """
+    Get the default discovery cache file path.
+
+    Returns
+    -------
+    str
+        A path under ``XDG_CACHE_HOME`` (default: ``~/.cache``).
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'),
+                                                                  '.cache')
+    return os.path.join(cache_home, 'energymon', 'discovery.json')
+
+def _finish_quietly(em: EnergyMon) -> None:
+    try:
+        em.finish()
+    except OSError:
+        pass
+
+def _failed(lib: str, func_get: str, error: str) -> ProbeResult:
+    return ProbeResult(lib, func_get, False, error, None, None, None, None)
+
+def _probe(lib: str, func_get: str, reads: int) -> Tuple[ProbeResult, Optional[EnergyMon]]:
+    # on success, the EnergyMon is left initialized
+    em = None
+    try:
+        em = EnergyMon(lib=lib, func_get=func_get)
+        source = em.get_source()
+        em.init()
+        interval_us = em.get_interval_us()
+        precision_uj = em.get_precision_uj()
+        start = time.perf_counter()
+        for _ in range(reads):
+            em.get_uj()
+        latency_s = (time.perf_counter() - start) / max(reads, 1)
+    except Exception as exc: # pylint: disable=broad-except
+        if em is not None:
+            _finish_quietly(em)
+        return _failed(lib, func_get, repr(exc)), None
+    return ProbeResult(lib, func_get, True, None, source, interval_us, precision_uj,
+                       latency_s), em
+
+def probe(lib: str, func_get: str='energymon_get_default', reads: int=3) -> ProbeResult:
+    """
+    Probe a candidate: load, "get", initialize, read, and finish.
+
+    Parameters
+    ----------
+    lib : str
+        The library name.
+    func_get : str, optional
+        The native "getter" function name.
+    reads : int, optional
+        The number of reads used to measure latency.
+
+    Returns
+    -------
+    ProbeResult
+        The result, which is not ``ok`` if any step raised an exception.
+    """
+    result, em = _probe(lib, func_get, reads)
+    if em is not None:
+        try:
+            em.finish()
+        except Exception as exc: # pylint: disable=broad-except
+            return _failed(lib, func_get, repr(exc))
+    return result
+
+def _rank_key(result: ProbeResult) -> tuple:
+    if not result.ok:
+        return (1,)
+    # an unknown precision (0) ranks after all known precisions
+    return (0, result.precision_uj == 0, result.precision_uj, result.interval_us,
+            result.latency_s)
+
+def rank(results: Sequence[ProbeResult]) -> List[ProbeResult]:
+    """
+    Rank probe results, best first.
+
+    Usable candidates rank before unusable ones, then by best (lowest, but known) precision,
+    shortest refresh interval, and lowest read latency.
+
+    Parameters
+    ----------
+    results : Sequence[ProbeResult]
+        The results to rank.
+
+    Returns
+    -------
+    List[ProbeResult]
+        The ranked results; the sort is stable, so ties keep their original order.
+    """
+    return sorted(results, key=_rank_key)
+
+def _probe_all(candidates: Sequence[Tuple[str, str]],
+               timeout_s: float) -> List[Tuple[ProbeResult, Optional[EnergyMon]]]:
+    # ranked results with the initialized EnergyMon of each usable candidate
+    outs = [None] * len(candidates) # type: List[Optional[Tuple[ProbeResult, Optional[EnergyMon]]]]
+    lock = threading.Lock()
+    abandoned = [False]
+
+    def _run(idx, lib, func_get):
+        out = _probe(lib, func_get, 3)
+        with lock:
+            if not abandoned[0]:
+                outs[idx] = out
+                return
+        # timed out - nobody else will finish it
+        if out[1] is not None:
+            _finish_quietly(out[1])
+
+    threads = []
+    for idx, (lib, func_get) in enumerate(candidates):
+        thread = threading.Thread(target=_run, args=(idx, lib, func_get),
+                                  name='energymon-probe', daemon=True)
+        thread.start()
+        threads.append(thread)
+    deadline = time.monotonic() + timeout_s
+    for thread in threads:
+        thread.join(max(0, deadline - time.monotonic()))
+    with lock:
+        abandoned[0] = True
+        final = list(outs)
+    for idx, (lib, func_get) in enumerate(candidates):
+        if final[idx] is None:
+            final[idx] = (_failed(lib, func_get, 'timed out'), None)
+    return sorted(final, key=lambda out: _rank_key(out[0]))
+
+def probe_all(candidates: Sequence[Tuple[str, str]]=DEFAULT_CANDIDATES,
+              timeout_s: float=5.0) -> List[ProbeResult]:
+    """
+    Probe candidates concurrently and rank the results.
+
+    Each candidate is probed on its own daemon thread.
+    Probes that don't complete within the timeout are reported as not ``ok`` and abandoned.
+
+    Parameters
+    ----------
+    candidates : Sequence[Tuple[str, str]], optional
+        The ``(lib, func_get)`` pairs to probe.
+    timeout_s : float, optional
+        The time in seconds to wait for all probes.
+
+    Returns
+    -------
+    List[ProbeResult]
+        The ranked results.
+    """
+    results = []
+    for result, em in _probe_all(candidates, timeout_s):
+        if em is not None:
+            _finish_quietly(em)
+        results.append(result)
+    return results
+
+def _read_cache(path: str) -> dict:
+    try:
+        with open(path, 'r') as cache:
+            data = json.load(cache)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def _write_cache(path: str, key: str, lib: str, func_get: str) -> None:
+    data = _read_cache(path)
+    data[key] = {'lib': lib, 'func_get': func_get}
+    tmp = path + '.' + str(os.getpid()) + '.tmp'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, 'w') as cache:
+            json.dump(data, cache)
+        os.replace(tmp, path)
+    except OSError:
+        # caching is best effort
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+def _init_cached(lib: str, func_get: str) -> Optional[EnergyMon]:
+    em = None
+    try:
+        em = EnergyMon(lib=lib, func_get=func_get)
+        em.init()
+        em.get_uj()
+    except Exception: # pylint: disable=broad-except
+        if em is not None:
+            _finish_quietly(em)
+        return None
+    return em
+
+def discover(candidates: Sequence[Tuple[str, str]]=DEFAULT_CANDIDATES, timeout_s: float=5.0,
+             use_cache: bool=True, cache_path: Optional[str]=None) -> EnergyMon:
+    """
+    Find the best available candidate and return an initialized ``EnergyMon`` for it.
+
+    If a cached decision exists for this host and is still among the candidates, that candidate
+    is initialized directly and checked with a single read; if it is no longer usable, all
+    candidates are probed.
+    Otherwise, the winning probe's ``EnergyMon`` is returned without reinitializing it.
+
+    Parameters
+    ----------
+    candidates : Sequence[Tuple[str, str]], optional
+        The ``(lib, func_get)`` pairs to probe.
+    timeout_s : float, optional
+        The time in seconds to wait for probes (not applied to a cached candidate).
+    use_cache : bool, optional
+        Whether to read and write the discovery cache.
+    cache_path : str, optional
+        The cache file path, default: ``default_cache_path()``.
+
+    Returns
+    -------
+    EnergyMon
+        An initialized ``EnergyMon`` for the best candidate; the caller must ``finish()`` it.
+
+    Raises
+    ------
+    OSError
+        If no candidate is usable.
+    """
+    candidates = [tuple(c) for c in candidates]
+    if cache_path is None:
+        cache_path = default_cache_path()
+    key = host_fingerprint()
+    if use_cache:
+        cached = _read_cache(cache_path).get(key)
+        if isinstance(cached, dict):
+            pair = (cached.get('lib'), cached.get('func_get'))
+            if pair in candidates:
+                em = _init_cached(*pair)
+                if em is not None:
+                    return em
+    outs = _probe_all(candidates, timeout_s)
+    if not outs or not outs[0][0].ok:
+        raise OSError('No usable energymon candidate: ' +
+                      '; '.join(r.lib + ':' + r.func_get + ': ' + str(r.error) for r, _ in outs))
+    best, em = outs[0]
+    for _, other in outs[1:]:
+        if other is not None:
+            _finish_quietly(other)
+    if use_cache:
+        _write_cache(cache_path, key, best.lib, best.func_get)
+    return em
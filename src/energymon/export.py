@@ -0,0 +1,283 @@
+"""
+Columnar export of energy traces to Apache Arrow and Parquet.
+
+Samples are accumulated in typed ``array.array`` buffers (no per-sample Python containers)
+which are handed to ``pyarrow`` through the buffer protocol without copying.
+
+Requires the optional ``pyarrow`` dependency for conversion and file output, e.g.:
+``pip install energymon[arrow]``.
+"""
+from array import array
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+TIMESTAMP_COLUMN = 'timestamp'
+"""Column name for sample timestamps (nanoseconds since the epoch)."""
+
+ENERGY_COLUMN = 'energy_uj'
+"""Column name for energy readings in microjoules."""
+
+if hasattr(time, 'time_ns'):
+    _time_ns = time.time_ns
+else: # Python < 3.7
+    def _time_ns() -> int:
+        return int(time.time() * 1000000000)
+
+def _import_pyarrow():
+    try:
+        import pyarrow # pylint: disable=import-outside-toplevel
+    except ImportError as err:
+        raise ImportError('pyarrow is required for Arrow/Parquet export: '
+                          'pip install energymon[arrow]') from err
+    return pyarrow
+
+def _import_parquet():
+    _import_pyarrow()
+    import pyarrow.parquet # pylint: disable=import-outside-toplevel
+    return pyarrow.parquet
+
+def monitor_metadata(em) -> Dict[str, str]:
+    """
+    Get the metadata of an initialized ``EnergyMon`` for use as schema metadata.
+
+    Parameters
+    ----------
+    em : EnergyMon
+        The energy monitor, which must be initialized.
+
+    Returns
+    -------
+    Dict[str, str]
+        The ``source``, ``interval_us``, ``precision_uj``, and ``exclusive`` values.
+    """
+    return {
+        'source': em.get_source(),
+        'interval_us': str(em.get_interval_us()),
+        'precision_uj': str(em.get_precision_uj()),
+        'exclusive': str(em.is_exclusive()),
+    }
+
+def schema(metadata: Optional[Dict[str, str]]=None):
+    """
+    Get the Arrow schema for energy traces.
+
+    Parameters
+    ----------
+    metadata : Dict[str, str], optional
+        Schema metadata, e.g., from ``monitor_metadata``.
+
+    Returns
+    -------
+    pyarrow.Schema
+        The schema.
+    """
+    pa = _import_pyarrow()
+    return pa.schema([(TIMESTAMP_COLUMN, pa.timestamp('ns')), (ENERGY_COLUMN, pa.uint64())],
+                     metadata=metadata)
+
+
+class TraceBuffer:
+    """
+    Accumulates ``(timestamp, energy)`` samples in columnar buffers.
+
+    Buffers are handed off (not copied) on conversion, after which the instance starts new,
+    empty buffers.
+    """
+
+    def __init__(self):
+        self._ts = array('q')
+        self._uj = array('Q')
+
+    def __len__(self) -> int:
+        return len(self._uj)
+
+    def append(self, timestamp_ns: int, uj: int) -> None:
+        """
+        Add a sample.
+
+        Parameters
+        ----------
+        timestamp_ns : int
+            The sample time in nanoseconds since the epoch.
+        uj : int
+            The total energy in microjoules.
+        """
+        self._ts.append(timestamp_ns)
+        self._uj.append(uj)
+
+    def sample(self, em) -> int:
+        """
+        Read an initialized ``EnergyMon`` and add the sample, timestamped with the current time.
+
+        Parameters
+        ----------
+        em : EnergyMon
+            The energy monitor to read.
+
+        Returns
+        -------
+        int
+            The total energy in microjoules.
+        """
+        uj = em.get_uj()
+        self._ts.append(_time_ns())
+        self._uj.append(uj)
+        return uj
+
+    def take(self) -> Tuple[array, array]:
+        """
+        Hand off the buffers and start new, empty ones.
+
+        Returns
+        -------
+        Tuple[array.array, array.array]
+            The timestamp (``'q'``) and energy (``'Q'``) buffers.
+        """
+        bufs = (self._ts, self._uj)
+        self._ts = array('q')
+        self._uj = array('Q')
+        return bufs
+
+    def to_record_batch(self, metadata: Optional[Dict[str, str]]=None):
+        """
+        Hand off the buffers as an Arrow record batch, without copying.
+
+        Parameters
+        ----------
+        metadata : Dict[str, str], optional
+            Schema metadata, e.g., from ``monitor_metadata``.
+
+        Returns
+        -------
+        pyarrow.RecordBatch
+            The samples.
+        """
+        pa = _import_pyarrow()
+        sch = schema(metadata)
+        ts_buf, uj_buf = self.take()
+        arrays = [
+            pa.Array.from_buffers(sch.field(TIMESTAMP_COLUMN).type, len(ts_buf),
+                                  [None, pa.py_buffer(ts_buf)]),
+            pa.Array.from_buffers(sch.field(ENERGY_COLUMN).type, len(uj_buf),
+                                  [None, pa.py_buffer(uj_buf)]),
+        ]
+        return pa.RecordBatch.from_arrays(arrays, schema=sch)
+
+
+class ParquetExporter:
+    """
+    Samples an ``EnergyMon`` into rolling Parquet files.
+
+    Samples are written as a row group every ``batch_rows`` samples, and a new file is started
+    once a file has at least ``rows_per_file`` rows.
+    Files are named ``<prefix>-<index>.parquet`` in the output directory.
+
+    Use as a context manager (or call ``close()``) to write buffered samples and close the
+    current file.
+    """
+
+    def __init__(self, em, directory: str, prefix: str='energymon',
+                 rows_per_file: int=1000000, batch_rows: int=65536,
+                 compression: str='snappy'):
+        """
+        Create a new instance.
+
+        Parameters
+        ----------
+        em : EnergyMon
+            The energy monitor, which must be initialized.
+        directory : str
+            The output directory, which is created if it doesn't exist.
+        prefix : str, optional
+            The file name prefix.
+        rows_per_file : int, optional
+            The number of rows after which to start a new file.
+        batch_rows : int, optional
+            The number of buffered samples after which to write a row group.
+        compression : str, optional
+            The Parquet compression codec.
+        """
+        self._pa = _import_pyarrow()
+        self._pq = _import_parquet()
+        self.em = em
+        self.directory = directory
+        self.prefix = prefix
+        self.rows_per_file = rows_per_file
+        self.batch_rows = batch_rows
+        self.compression = compression
+        self.metadata = monitor_metadata(em)
+        self._schema = schema(self.metadata)
+        self._buffer = TraceBuffer()
+        self._writer = None
+        self._file_rows = 0
+        self._files = [] # type: List[str]
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def files(self) -> List[str]:
+        """List[str]: The paths of files written (or being written)."""
+        return list(self._files)
+
+    def sample(self) -> int:
+        """
+        Read the energy monitor and buffer the sample.
+
+        Returns
+        -------
+        int
+            The total energy in microjoules.
+        """
+        uj = self._buffer.sample(self.em)
+        if len(self._buffer) >= self.batch_rows:
+            self.flush()
+        return uj
+
+    def append(self, timestamp_ns: int, uj: int) -> None:
+        """
+        Buffer a sample.
+
+        Parameters
+        ----------
+        timestamp_ns : int
+            The sample time in nanoseconds since the epoch.
+        uj : int
+            The total energy in microjoules.
+        """
+        self._buffer.append(timestamp_ns, uj)
+        if len(self._buffer) >= self.batch_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write buffered samples as a row group, rotating files as needed."""
+        if not self._buffer:
+            return
+        if self._writer is None:
+            path = os.path.join(self.directory,
+                                '{}-{:06d}.parquet'.format(self.prefix, len(self._files)))
+            self._writer = self._pq.ParquetWriter(path, self._schema,
+                                                  compression=self.compression)
+            self._files.append(path)
+            self._file_rows = 0
+        batch = self._buffer.to_record_batch(self.metadata)
+        self._writer.write_table(self._pa.Table.from_batches([batch]))
+        self._file_rows += batch.num_rows
+        if self._file_rows >= self.rows_per_file:
+            self.rotate()
+
+    def rotate(self) -> None:
+        """Close the current file; the next write starts a new file."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def close(self) -> None:
+        """Write buffered samples and close the current file."""
+        self.flush()
+        self.rotate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
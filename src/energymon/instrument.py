@@ -0,0 +1,296 @@
+"""
+Opt-in instrumentation for ``util`` functions and ``EnergyMon`` methods.
+
+When enabled, calls are counted and timed, errors are broken down by ``errno``, and lifecycle
+events (init, finish, and context enter/exit) are logged.
+Instrumentation works by replacing the module functions and class methods with wrappers, and
+disabling it restores the originals, so there is no cost when it is not enabled.
+
+Only calls made through the ``util`` module attributes and the ``EnergyMon`` class are
+instrumented; functions imported by name (``from energymon.util import get_uj``) before
+enabling are not.
+Since ``EnergyMon`` methods call ``util`` functions, both levels are recorded separately.
+"""
+from collections import deque
+import functools
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from . import util
+from .context import EnergyMon
+
+NUM_BUCKETS = 40
+"""
+Number of latency histogram buckets.
+Bucket ``i`` counts latencies ``< 2**i`` nanoseconds and ``>= 2**(i-1)`` nanoseconds;
+the last bucket also counts all larger latencies.
+"""
+
+MAX_EVENTS = 256
+"""Number of lifecycle events retained."""
+
+_UTIL_FUNCTIONS = ('load_energymon_library', 'get_energymon', 'init', 'finish', 'get_uj',
+                   'get_source', 'get_interval_us', 'get_precision_uj', 'is_exclusive')
+_ENERGYMON_METHODS = ('init', 'finish', 'get_uj', 'get_source', 'get_interval_us',
+                      'get_precision_uj', 'is_exclusive', '__enter__', '__exit__')
+_LIFECYCLE = frozenset(('util.init', 'util.finish', 'EnergyMon.init', 'EnergyMon.finish',
+                        'EnergyMon.__enter__', 'EnergyMon.__exit__'))
+
+Hook = Callable[[str, int, Optional[BaseException]], None]
+
+
+class CallStats:
+    """Statistics for a single instrumented function or method."""
+
+    __slots__ = ('name', 'count', 'errors', 'errnos', 'total_ns', 'max_ns', 'buckets', '_lock')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.errors = 0
+        self.errnos = {} # type: Dict[int, int]
+        self.total_ns = 0
+        self.max_ns = 0
+        self.buckets = [0] * NUM_BUCKETS
+        self._lock = threading.Lock()
+
+    def record(self, elapsed_ns: int, error: Optional[BaseException]=None) -> None:
+        """
+        Record a call.
+
+        Parameters
+        ----------
+        elapsed_ns : int
+            The call latency in nanoseconds.
+        error : BaseException, optional
+            The exception raised by the call, if any.
+        """
+        idx = elapsed_ns.bit_length()
+        if idx >= NUM_BUCKETS:
+            idx = NUM_BUCKETS - 1
+        with self._lock:
+            self.count += 1
+            self.total_ns += elapsed_ns
+            if elapsed_ns > self.max_ns:
+                self.max_ns = elapsed_ns
+            self.buckets[idx] += 1
+            if error is not None:
+                self.errors += 1
+                errno = getattr(error, 'errno', None)
+                if errno is not None:
+                    self.errnos[errno] = self.errnos.get(errno, 0) + 1
+
+    def snapshot(self) -> dict:
+        """
+        Get a consistent copy of the statistics.
+
+        Returns
+        -------
+        dict
+            The statistics.
+        """
+        with self._lock:
+            return {'count': self.count, 'errors': self.errors, 'errnos': dict(self.errnos),
+                    'total_ns': self.total_ns, 'max_ns': self.max_ns,
+                    'buckets': list(self.buckets)}
+
+
+_lock = threading.Lock()
+_enabled = False
+_originals = {} # type: Dict[Tuple[object, str], Callable]
+_stats = {} # type: Dict[str, CallStats]
+_hooks = () # type: Tuple[Hook, ...]
+_events = deque(maxlen=MAX_EVENTS) # type: deque
+
+def _wrap(name: str, func: Callable) -> Callable:
+    stats = _stats.setdefault(name, CallStats(name))
+    lifecycle = name in _LIFECYCLE
+    perf_counter = time.perf_counter
+
+    def _done(start: float, error: Optional[BaseException]) -> None:
+        elapsed_ns = int((perf_counter() - start) * 1000000000)
+        stats.record(elapsed_ns, error)
+        if lifecycle:
+            _events.append((time.time(), name, None if error is None else
+                            getattr(error, 'errno', None) or type(error).__name__))
+        for hook in _hooks:
+            hook(name, elapsed_ns, error)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            ret = func(*args, **kwargs)
+        except BaseException as exc:
+            _done(start, exc)
+            raise
+        _done(start, None)
+        return ret
+    return wrapper
+
+def enable() -> None:
+    """
+    Enable instrumentation.
+    If already enabled, this is a no-op.
+    """
+    global _enabled # pylint: disable=global-statement
+    with _lock:
+        if _enabled:
+            return
+        for fname in _UTIL_FUNCTIONS:
+            func = getattr(util, fname)
+            _originals[(util, fname)] = func
+            setattr(util, fname, _wrap('util.' + fname, func))
+        for mname in _ENERGYMON_METHODS:
+            func = EnergyMon.__dict__[mname]
+            _originals[(EnergyMon, mname)] = func
+            setattr(EnergyMon, mname, _wrap('EnergyMon.' + mname, func))
+        _enabled = True
+
+def disable() -> None:
+    """
+    Disable instrumentation, restoring the original functions and methods.
+    Recorded statistics are retained until ``reset()`` is called.
+    If not enabled, this is a no-op.
+    """
+    global _enabled # pylint: disable=global-statement
+    with _lock:
+        if not _enabled:
+            return
+        for (owner, name), func in _originals.items():
+            setattr(owner, name, func)
+        _originals.clear()
+        _enabled = False
+
+def is_enabled() -> bool:
+    """
+    Get whether instrumentation is enabled.
+
+    Returns
+    -------
+    bool
+        True if enabled, False otherwise.
+    """
+    return _enabled
+
+def reset() -> None:
+    """Clear all recorded statistics and events."""
+    with _lock:
+        for stats in _stats.values():
+            with stats._lock:
+                stats.count = 0
+                stats.errors = 0
+                stats.errnos.clear()
+                stats.total_ns = 0
+                stats.max_ns = 0
+                stats.buckets[:] = [0] * NUM_BUCKETS
+        _events.clear()
+
+def add_hook(hook: Hook) -> None:
+    """
+    Add a hook to be called after every instrumented call.
+
+    Hooks are called in the calling thread, so they should be fast and must not raise.
+
+    Parameters
+    ----------
+    hook : Callable[[str, int, Optional[BaseException]], None]
+        Called with the instrumented name (e.g., ``'util.get_uj'``), the latency in nanoseconds,
+        and the exception raised by the call (or None).
+    """
+    global _hooks # pylint: disable=global-statement
+    with _lock:
+        _hooks = _hooks + (hook,)
+
+def remove_hook(hook: Hook) -> None:
+    """
+    Remove a hook previously added with ``add_hook``.
+
+    Parameters
+    ----------
+    hook : Callable[[str, int, Optional[BaseException]], None]
+        The hook to remove.
+
+    Raises
+    ------
+    ValueError
+        If the hook is not registered.
+    """
+    global _hooks # pylint: disable=global-statement
+    with _lock:
+        hooks = list(_hooks)
+        hooks.remove(hook)
+        _hooks = tuple(hooks)
+
+def events() -> List[tuple]:
+    """
+    Get the most recent lifecycle events.
+
+    Returns
+    -------
+    List[tuple]
+        Tuples of ``(timestamp, name, error)``, where ``timestamp`` is from ``time.time()``
+        and ``error`` is None on success, otherwise the ``errno`` or exception class name.
+    """
+    return list(_events)
+
+def snapshot() -> dict:
+    """
+    Get a snapshot of all recorded statistics.
+
+    Returns
+    -------
+    dict
+        A dictionary with keys ``'enabled'``, ``'calls'`` (statistics keyed by instrumented
+        name, for names that have been called), and ``'events'``.
+    """
+    calls = {}
+    for name, stats in list(_stats.items()):
+        snap = stats.snapshot()
+        if snap['count']:
+            calls[name] = snap
+    return {'enabled': _enabled, 'calls': calls, 'events': events()}
+
+def bucket_upper_bound_ns(index: int) -> int:
+    """
+    Get the exclusive upper bound of a latency histogram bucket.
+
+    Parameters
+    ----------
+    index : int
+        The bucket index.
+
+    Returns
+    -------
+    int
+        The upper bound in nanoseconds (the last bucket is unbounded, but its nominal bound is
+        returned).
+    """
+    return 1 << index
+
+def percentile_ns(buckets: List[int], p: float) -> int:
+    """
+    Estimate a latency percentile from histogram buckets.
+
+    Parameters
+    ----------
+    buckets : List[int]
+        Bucket counts, e.g., from a ``snapshot()``.
+    p : float
+        The percentile, in the range ``[0, 100]``.
+
+    Returns
+    -------
+    int
+        The upper bound of the bucket containing the percentile, or 0 if there are no counts.
+    """
+    total = sum(buckets)
+    if total == 0:
+        return 0
+    target = p / 100 * total
+    cumulative = 0
+    for idx, count in enumerate(buckets):
+        cumulative += count
+        if count and cumulative >= target:
+            return bucket_upper_bound_ns(idx)
+    return bucket_upper_bound_ns(len(buckets) - 1)
@@ -0,0 +1,362 @@
+"""
+Retry, deadline, and circuit-breaker policies for reading an ``energymon``.
+
+Some sensors fail transiently (e.g., with ``EAGAIN`` or ``EBUSY`` while refreshing), and some
+may hang.
+A ``GuardedReader`` wraps an ``EnergyMon`` to retry transient failures with jittered backoff,
+enforce per-call deadlines, and stop reading a failing sensor, serving the last good value
+(flagged as stale) instead.
+"""
+from collections import namedtuple
+from concurrent.futures import Future, wait
+import errno
+import queue
+import random
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+Reading = namedtuple('Reading', ['uj', 'stale'])
+Reading.__doc__ = """
+An energy reading.
+
+Attributes
+----------
+uj : int
+    The total energy in microjoules.
+stale : bool
+    True if the value is the last good reading rather than a new one.
+"""
+
+class RetryPolicy:
+    """
+    Bounded retries with jittered exponential backoff.
+
+    By default, the base backoff delay is the monitor's refresh interval, since retrying sooner
+    is unlikely to observe a refreshed sensor.
+    """
+
+    def __init__(self, max_attempts: int=3, base_delay_us: Optional[int]=None,
+                 max_delay_us: int=100000,
+                 retry_errnos: Iterable[int]=(errno.EAGAIN, errno.EBUSY, errno.EINTR)):
+        """
+        Create a new instance.
+
+        Parameters
+        ----------
+        max_attempts : int, optional
+            The maximum number of attempts per call (including the first).
+        base_delay_us : int, optional
+            The base backoff delay in microseconds.
+            If None, the monitor's refresh interval (``get_interval_us()``) is used.
+        max_delay_us : int, optional
+            The maximum backoff delay in microseconds.
+        retry_errnos : Iterable[int], optional
+            The ``errno`` values that are considered transient.
+        """
+        if max_attempts < 1:
+            raise ValueError('max_attempts must be >= 1')
+        self.max_attempts = max_attempts
+        self.base_delay_us = base_delay_us
+        self.max_delay_us = max_delay_us
+        self.retry_errnos = frozenset(retry_errnos)
+
+    def should_retry(self, err: OSError, attempt: int) -> bool:
+        """
+        Get whether to retry after a failed attempt.
+
+        Parameters
+        ----------
+        err : OSError
+            The error raised by the attempt.
+        attempt : int
+            The number of attempts made so far.
+
+        Returns
+        -------
+        bool
+            True to retry, False otherwise.
+        """
+        return attempt < self.max_attempts and err.errno in self.retry_errnos
+
+    def delay_s(self, attempt: int, base_delay_us: int, rand: random.Random) -> float:
+        """
+        Get the backoff delay before the next attempt.
+
+        Parameters
+        ----------
+        attempt : int
+            The number of attempts made so far.
+        base_delay_us : int
+            The base delay in microseconds.
+        rand : random.Random
+            The source of jitter.
+
+        Returns
+        -------
+        float
+            The delay in seconds, uniformly distributed in the upper half of the exponential
+            backoff window.
+        """
+        delay_us = min(self.max_delay_us, base_delay_us * (1 << (attempt - 1)))
+        return rand.uniform(delay_us / 2, delay_us) / 1000000
+
+
+class CircuitBreaker:
+    """
+    A circuit breaker that stops calls after consecutive failures.
+
+    After ``failure_threshold`` consecutive failures, the breaker opens and disallows calls.
+    After ``reset_timeout_s``, it half-opens and allows a single trial call: success closes the
+    breaker, failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold: int=5, reset_timeout_s: float=1.0,
+                 clock: Callable[[], float]=time.monotonic):
+        """
+        Create a new instance.
+
+        Parameters
+        ----------
+        failure_threshold : int, optional
+            The number of consecutive failures that opens the breaker.
+        reset_timeout_s : float, optional
+            The time in seconds before an open breaker allows a trial call.
+        clock : Callable[[], float], optional
+            The clock function.
+        """
+        if failure_threshold < 1:
+            raise ValueError('failure_threshold must be >= 1')
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None # type: Optional[float]
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        """str: The breaker state: ``CLOSED``, ``OPEN``, or ``HALF_OPEN``."""
+        with self._lock:
+            if self._opened_at is None:
+                return self.CLOSED
+            if self._trial or self._clock() - self._opened_at >= self.reset_timeout_s:
+                return self.HALF_OPEN
+            return self.OPEN
+
+    def allow(self) -> bool:
+        """
+        Get whether a call is allowed.
+        In the half-open state, only one trial call is allowed until its outcome is recorded.
+
+        Returns
+        -------
+        bool
+            True if the call may proceed, False otherwise.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial or self._clock() - self._opened_at < self.reset_timeout_s:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self) -> None:
+        """Record a successful call, closing the breaker."""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> None:
+        """Record a failed call, possibly opening the breaker."""
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+            self._trial = False
+
+
+class _DeadlineExceeded(TimeoutError):
+    """A deadline expired, as opposed to a native read failing with ``ETIMEDOUT``."""
+
+
+class _Worker:
+    """A daemon thread that runs calls, so callers can stop waiting on a hung call."""
+
+    def __init__(self):
+        self._queue = queue.Queue() # type: queue.Queue
+        self._thread = threading.Thread(target=self._run, name='energymon-policy', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            func, fut = item
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                fut.set_result(func())
+            except BaseException as exc: # pylint: disable=broad-except
+                fut.set_exception(exc)
+
+    def submit(self, func: Callable) -> Future:
+        fut = Future() # type: Future
+        self._queue.put((func, fut))
+        return fut
+
+    def stop(self):
+        self._queue.put(None)
+
+
+class GuardedReader:
+    """
+    Reads an initialized ``EnergyMon`` subject to retry, deadline, and circuit-breaker policies.
+
+    If a read ultimately fails with an ``OSError`` (including a ``TimeoutError`` when the
+    deadline expires) or the breaker is open, the last good value is returned as a stale
+    ``Reading``; if there is no last good value, the error is raised.
+    Other errors are never suppressed.
+
+    This class is thread-safe, but reads with a deadline are serialized on a single worker
+    thread, so concurrent callers wait their turn within their own deadlines.
+    Once a call has overrun its deadline, later calls fail immediately until it completes.
+    """
+
+    def __init__(self, em, retry: Optional[RetryPolicy]=None,
+                 breaker: Optional[CircuitBreaker]=None, timeout_s: Optional[float]=None,
+                 seed: Optional[int]=None):
+        """
+        Create a new instance.
+
+        Parameters
+        ----------
+        em : EnergyMon
+            The energy monitor, which must be initialized before reading.
+        retry : RetryPolicy, optional
+            The retry policy, or None to not retry.
+        breaker : CircuitBreaker, optional
+            The circuit breaker, or None to always attempt reads.
+        timeout_s : float, optional
+            The deadline in seconds for each call to ``get_uj`` (including retries), or None to
+            not enforce a deadline.
+            If set, reads run on a worker thread.
+        seed : int, optional
+            Seed for backoff jitter.
+        """
+        self.em = em
+        self.retry = retry
+        self.breaker = breaker
+        self.timeout_s = timeout_s
+        self._rand = random.Random(seed)
+        self._lock = threading.Lock()
+        self._last_uj = None # type: Optional[int]
+        self._interval_us = None # type: Optional[int]
+        self._worker = None # type: Optional[_Worker]
+        # a call that overran its deadline and may be hung in the native read
+        self._hung = None # type: Optional[Future]
+
+    @property
+    def last_uj(self) -> Optional[int]:
+        """Optional[int]: The last good reading in microjoules, or None."""
+        return self._last_uj
+
+    def _base_delay_us(self, deadline: Optional[float]) -> int:
+        if self.retry.base_delay_us is not None:
+            return self.retry.base_delay_us
+        if self._interval_us is None:
+            # subject to the deadline too, since the sensor may be hung
+            self._interval_us = self._call(self.em.get_interval_us, deadline)
+        return self._interval_us
+
+    def _call(self, func: Callable[[], int], deadline: Optional[float]) -> int:
+        if deadline is None:
+            return func()
+        with self._lock:
+            if self._hung is not None and not self._hung.done():
+                # don't queue behind a call that may never complete
+                raise _DeadlineExceeded(errno.ETIMEDOUT, 'previous read has not completed')
+            if self._worker is None:
+                self._worker = _Worker()
+            pending = self._worker.submit(func)
+        # don't use result(timeout): since Python 3.11, its TimeoutError is indistinguishable
+        # from a native ETIMEDOUT raised by the call
+        if not wait([pending], max(0, deadline - time.monotonic())).done:
+            # if still queued behind another call, just drop it
+            if not pending.cancel():
+                with self._lock:
+                    self._hung = pending
+            raise _DeadlineExceeded(errno.ETIMEDOUT, 'read timed out')
+        return pending.result()
+
+    def _read_with_retry(self) -> int:
+        deadline = None if self.timeout_s is None else time.monotonic() + self.timeout_s
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return self._call(self.em.get_uj, deadline)
+            except _DeadlineExceeded:
+                raise
+            except OSError as err:
+                # a native ETIMEDOUT is a TimeoutError too, but may be retried
+                if self.retry is None or not self.retry.should_retry(err, attempt):
+                    raise
+                delay = self.retry.delay_s(attempt, self._base_delay_us(deadline), self._rand)
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= delay:
+                        raise _DeadlineExceeded(errno.ETIMEDOUT, 'read timed out') from err
+                time.sleep(delay)
+
+    def get_uj(self) -> Reading:
+        """
+        Get the total energy in microjoules.
+
+        Returns
+        -------
+        Reading
+            The reading, which is stale if the read failed or was not attempted.
+
+        Raises
+        ------
+        OSError
+            If the read failed or was not attempted and there is no last good value.
+            If the circuit breaker is open, ``errno`` is ``EAGAIN``.
+        """
+        if self.breaker is not None and not self.breaker.allow():
+            if self._last_uj is None:
+                raise OSError(errno.EAGAIN, 'circuit breaker is open')
+            return Reading(self._last_uj, True)
+        try:
+            uj = self._read_with_retry()
+        except OSError:
+            if self.breaker is not None:
+                self.breaker.record_failure()
+            if self._last_uj is None:
+                raise
+            return Reading(self._last_uj, True)
+        except BaseException:
+            # the breaker must not get stuck waiting for a trial outcome
+            if self.breaker is not None:
+                self.breaker.record_failure()
+            raise
+        if self.breaker is not None:
+            self.breaker.record_success()
+        self._last_uj = uj
+        return Reading(uj, False)
+
+    def close(self) -> None:
+        """Stop the worker thread, if any. A hung read is abandoned."""
+        with self._lock:
+            if self._worker is not None:
+                self._worker.stop()
+                self._worker = None
@@ -0,0 +1,326 @@
+"""
+A pool of initialized ``EnergyMon`` instances.
+
+Initializing and finishing a native ``energymon`` can be expensive (e.g., opening device files
+or starting polling threads).
+A pool keeps initialized monitors for reuse, keyed by library and getter function, so
+request-scoped code doesn't pay these costs for every job.
+Pooled monitors are finished when idle too long, when evicted, when the pool is closed or
+garbage collected, or at interpreter exit.
+"""
+from contextlib import contextmanager
+from ctypes import CDLL
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+import weakref
+from .context import EnergyMon
+
+Key = Tuple[Union[str, CDLL], str]
+
+def _finish(em: EnergyMon) -> None:
+    try:
+        em.finish()
+    except OSError:
+        pass
+
+def _finish_idle(lock: threading.Lock, idle: Dict[Key, List[Tuple[EnergyMon, float]]]) -> None:
+    # must not reference the pool, so it can run when the pool is garbage collected
+    with lock:
+        ems = [em for entries in idle.values() for em, _ in entries]
+        idle.clear()
+    for em in ems:
+        _finish(em)
+
+
+class EnergyMonPool:
+    """
+    A thread-safe, keyed pool of initialized ``EnergyMon`` instances.
+
+    Each checked-out monitor is used by one caller at a time.
+    At most ``max_size`` monitors are retained (idle or checked out); monitors created beyond
+    that are finished when released.
+    """
+
+    def __init__(self, max_size: int=8, idle_timeout_s: Optional[float]=300.0,
+                 health_check: bool=True, clock: Callable[[], float]=time.monotonic):
+        """
+        Create a new instance.
+
+        Parameters
+        ----------
+        max_size : int, optional
+            The maximum number of monitors to retain.
+        idle_timeout_s : float, optional
+            The time in seconds after which an idle monitor is finished, or None to keep idle
+            monitors until evicted or the pool is closed.
+        health_check : bool, optional
+            Whether to probe an idle monitor with ``get_uj()`` before handing it out.
+            Monitors that fail are finished and replaced.
+        clock : Callable[[], float], optional
+            The clock, in seconds, used for idle timeouts.
+        """
+        if max_size < 0:
+            raise ValueError('max_size must be >= 0')
+        self.max_size = max_size
+        self.idle_timeout_s = idle_timeout_s
+        self.health_check = health_check
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._idle = {} # type: Dict[Key, List[Tuple[EnergyMon, float]]]
+        self._in_use = {} # type: Dict[int, Tuple[Key, bool]]
+        self._retained = 0
+        self._closed = False
+        # the earliest time an idle monitor may expire, so acquire() can skip scanning
+        self._next_expiry = float('inf')
+        # also runs at interpreter exit
+        self._finalizer = weakref.finalize(self, _finish_idle, self._lock, self._idle)
+
+    @property
+    def size(self) -> int:
+        """int: The number of retained monitors (idle or checked out)."""
+        return self._retained
+
+    @property
+    def idle(self) -> int:
+        """int: The number of idle monitors."""
+        with self._lock:
+            return sum(len(entries) for entries in self._idle.values())
+
+    def _expired_locked(self, now: float) -> List[EnergyMon]:
+        expired = [] # type: List[EnergyMon]
+        if self.idle_timeout_s is None or now < self._next_expiry:
+            return expired
+        next_expiry = float('inf')
+        for key in list(self._idle):
+            entries = self._idle[key]
+            # entries are in release order, so the oldest are first
+            idx = 0
+            while idx < len(entries) and now - entries[idx][1] >= self.idle_timeout_s:
+                idx += 1
+            expired.extend(em for em, _ in entries[:idx])
+            if idx < len(entries):
+                del entries[:idx]
+                next_expiry = min(next_expiry, entries[0][1] + self.idle_timeout_s)
+            else:
+                del self._idle[key]
+        self._next_expiry = next_expiry
+        self._retained -= len(expired)
+        return expired
+
+    def _evict_lru_locked(self) -> Optional[EnergyMon]:
+        lru_key = None
+        lru_time = None
+        for key, entries in self._idle.items():
+            if lru_time is None or entries[0][1] < lru_time:
+                lru_key, lru_time = key, entries[0][1]
+        if lru_key is None:
+            return None
+        entries = self._idle[lru_key]
+        em = entries.pop(0)[0]
+        if not entries:
+            del self._idle[lru_key]
+        self._retained -= 1
+        return em
+
+    def reap(self) -> int:
+        """
+        Finish monitors that have been idle longer than the idle timeout.
+
+        Returns
+        -------
+        int
+            The number of monitors finished.
+        """
+        with self._lock:
+            expired = self._expired_locked(self.clock())
+        for em in expired:
+            _finish(em)
+        return len(expired)
+
+    def acquire(self, lib: Union[str, CDLL]='energymon-default',
+                func_get: str='energymon_get_default') -> EnergyMon:
+        """
+        Check out an initialized monitor, creating one if none is idle.
+
+        Must be paired with ``release``; prefer ``checkout``.
+
+        Parameters
+        ----------
+        lib : Union[str, ctypes.CDLL], optional
+            The library name or handle.
+        func_get : str, optional
+            The native "getter" function name.
+
+        Returns
+        -------
+        EnergyMon
+            An initialized monitor.
+
+        Raises
+        ------
+        ValueError
+            If the pool is closed.
+        """
+        key = (lib, func_get)
+        while True:
+            to_finish = []
+            with self._lock:
+                if self._closed:
+                    raise ValueError('pool is closed')
+                to_finish.extend(self._expired_locked(self.clock()))
+                entries = self._idle.get(key)
+                em = entries.pop()[0] if entries else None
+                if entries is not None and not entries:
+                    del self._idle[key]
+                if em is not None:
+                    self._in_use[id(em)] = (key, True)
+            for old in to_finish:
+                _finish(old)
+            if em is None:
+                break
+            if not self.health_check:
+                return em
+            try:
+                em.get_uj()
+            except OSError:
+                self.release(em, discard=True)
+                continue
+            except BaseException:
+                self.release(em, discard=True)
+                raise
+            return em
+
+        em = EnergyMon(lib=lib, func_get=func_get)
+        em.init()
+        evicted = None
+        with self._lock:
+            pooled = not self._closed and self._retained < self.max_size
+            if not pooled and not self._closed and self.max_size > 0:
+                evicted = self._evict_lru_locked()
+                pooled = evicted is not None
+            if pooled:
+                self._retained += 1
+            self._in_use[id(em)] = (key, pooled)
+        if evicted is not None:
+            _finish(evicted)
+        return em
+
+    def release(self, em: EnergyMon, discard: bool=False) -> None:
+        """
+        Return a monitor checked out with ``acquire``.
+
+        Parameters
+        ----------
+        em : EnergyMon
+            The monitor.
+        discard : bool, optional
+            If True, finish the monitor rather than keeping it for reuse, e.g., if it failed.
+
+        Raises
+        ------
+        ValueError
+            If the monitor is not checked out from this pool.
+        """
+        with self._lock:
+            try:
+                key, pooled = self._in_use.pop(id(em))
+            except KeyError:
+                raise ValueError('monitor is not checked out from this pool') from None
+            keep = pooled and not discard and not self._closed and em.initialized
+            if keep:
+                now = self.clock()
+                self._idle.setdefault(key, []).append((em, now))
+                if self.idle_timeout_s is not None:
+                    self._next_expiry = min(self._next_expiry, now + self.idle_timeout_s)
+            elif pooled:
+                self._retained -= 1
+        if not keep:
+            _finish(em)
+
+    @contextmanager
+    def checkout(self, lib: Union[str, CDLL]='energymon-default',
+                 func_get: str='energymon_get_default'):
+        """
+        Check out an initialized monitor for the duration of a ``with`` block.
+
+        If the block raises an ``OSError``, the monitor is discarded rather than reused.
+
+        Parameters
+        ----------
+        lib : Union[str, ctypes.CDLL], optional
+            The library name or handle.
+        func_get : str, optional
+            The native "getter" function name.
+
+        Yields
+        ------
+        EnergyMon
+            An initialized monitor.
+        """
+        em = self.acquire(lib, func_get)
+        try:
+            yield em
+        except OSError:
+            self.release(em, discard=True)
+            raise
+        except BaseException:
+            self.release(em)
+            raise
+        self.release(em)
+
+    def close(self) -> None:
+        """
+        Finish all idle monitors and stop pooling.
+        Checked-out monitors are finished when released.
+        """
+        with self._lock:
+            self._closed = True
+            idle = [em for entries in self._idle.values() for em, _ in entries]
+            self._idle.clear()
+            self._retained -= len(idle)
+        self._finalizer.detach()
+        for em in idle:
+            _finish(em)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+_default_pool = None # type: Optional[EnergyMonPool]
+_default_lock = threading.Lock()
+
+def default_pool() -> EnergyMonPool:
+    """
+    Get the process-wide default pool, creating it if needed.
+
+    Returns
+    -------
+    EnergyMonPool
+        The default pool.
+    """
+    global _default_pool # pylint: disable=global-statement
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = EnergyMonPool()
+        return _default_pool
+
+def checkout(lib: Union[str, CDLL]='energymon-default', func_get: str='energymon_get_default'):
+    """
+    Check out an initialized monitor from the default pool for the duration of a ``with`` block.
+
+    Parameters
+    ----------
+    lib : Union[str, ctypes.CDLL], optional
+        The library name or handle.
+    func_get : str, optional
+        The native "getter" function name.
+
+    Returns
+    -------
+    A context manager that yields an initialized ``EnergyMon``.
+    """
+    return default_pool().checkout(lib, func_get)
@@ -0,0 +1,211 @@
+"""
+Energy measurement of subprocesses and process pools.
+
+An ``EnergyMon`` can't be shared with child processes, so work in children is measured from
+the parent's monitor, bracketing the work as tightly as possible: a subprocess from when its
+program has been executed until it has exited, and an executor batch from its first submission
+until its last result, excluding pool startup (workers are warmed up first) and teardown.
+
+Since the monitor measures the whole system (or package, etc.), concurrent activity is included.
+"""
+from collections import namedtuple
+import os
+import subprocess
+import time
+from typing import Callable, Iterable, List, Optional
+
+Measurement = namedtuple('Measurement', ['energy_uj', 'elapsed_s', 'tasks'])
+Measurement.__doc__ = """
+An energy measurement.
+
+Attributes
+----------
+energy_uj : int
+    The energy consumed in microjoules.
+elapsed_s : float
+    The elapsed time in seconds.
+tasks : int
+    The number of tasks (1 for a subprocess).
+"""
+
+MeasuredRun = namedtuple('MeasuredRun', ['completed', 'energy_uj', 'elapsed_s'])
+MeasuredRun.__doc__ = """
+The result of ``measured_run``.
+
+Attributes
+----------
+completed : subprocess.CompletedProcess
+    The completed process.
+energy_uj : int
+    The energy consumed while the process ran, in microjoules.
+elapsed_s : float
+    The elapsed time in seconds.
+"""
+
+def measured_run(em, args, input=None, timeout: Optional[float]=None, check: bool=False,
+                 capture_output: bool=False, **kwargs) -> MeasuredRun:
+    """
+    Run a command like ``subprocess.run`` and measure the energy consumed while it runs.
+
+    The measurement starts once the child has successfully executed the program (when
+    ``subprocess.Popen`` returns) and ends once the child has exited and been reaped, so it
+    excludes the parent's fork overhead.
+
+    Parameters
+    ----------
+    em : EnergyMon
+        The energy monitor, which must be initialized.
+    args
+        The command, as for ``subprocess.Popen``.
+    input : bytes or str, optional
+        Data to send to the child's stdin.
+    timeout : float, optional
+        The timeout in seconds; if it expires, the child is killed and
+        ``subprocess.TimeoutExpired`` is raised.
+    check : bool, optional
+        If True, raise ``subprocess.CalledProcessError`` for a non-zero exit status.
+    capture_output : bool, optional
+        If True, capture stdout and stderr.
+    **kwargs
+        Additional arguments for ``subprocess.Popen``.
+
+    Returns
+    -------
+    MeasuredRun
+        The completed process and the measurement.
+    """
+    # pylint: disable=redefined-builtin
+    if input is not None:
+        kwargs['stdin'] = subprocess.PIPE
+    if capture_output:
+        kwargs['stdout'] = subprocess.PIPE
+        kwargs['stderr'] = subprocess.PIPE
+    with subprocess.Popen(args, **kwargs) as proc:
+        start_uj = em.get_uj()
+        start_s = time.perf_counter()
+        try:
+            stdout, stderr = proc.communicate(input, timeout=timeout)
+        except subprocess.TimeoutExpired as exc:
+            proc.kill()
+            exc.stdout, exc.stderr = proc.communicate()
+            raise
+        except BaseException:
+            proc.kill()
+            raise
+        end_uj = em.get_uj()
+        elapsed_s = time.perf_counter() - start_s
+        retcode = proc.poll()
+    completed = subprocess.CompletedProcess(proc.args, retcode, stdout, stderr)
+    if check:
+        completed.check_returncode()
+    return MeasuredRun(completed, end_uj - start_uj, elapsed_s)
+
+def _warmup_task(delay_s: float) -> None:
+    time.sleep(delay_s)
+
+
+class MeasuredExecutor:
+    """
+    Wraps a ``concurrent.futures.Executor`` to measure the energy of each submitted batch.
+
+    Before the first batch, the executor is warmed up by running a sleeping no-op task per
+    worker, so worker startup is not included in measurements.
+    Measurements end when the last result of a batch is available, so executor teardown is not
+    included either.
+    As a context manager, the executor is shut down on exit.
+    """
+
+    def __init__(self, executor, em, warmup: bool=True, warmup_delay_s: float=0.05):
+        """
+        Create a new instance.
+
+        Parameters
+        ----------
+        executor : concurrent.futures.Executor
+            The executor, e.g., a ``ProcessPoolExecutor``.
+        em : EnergyMon
+            The energy monitor, which must be initialized.
+        warmup : bool, optional
+            Whether to warm up the executor before the first batch.
+        warmup_delay_s : float, optional
+            The duration of each warmup task, long enough that each task occupies a worker.
+        """
+        self.executor = executor
+        self.em = em
+        self.warmup_delay_s = warmup_delay_s
+        self.measurements = [] # type: List[Measurement]
+        self._warm = not warmup
+
+    def warm_up(self, workers: Optional[int]=None) -> None:
+        """
+        Start the executor's workers by running a sleeping no-op task on each.
+
+        Parameters
+        ----------
+        workers : int, optional
+            The number of workers, default: the executor's maximum.
+        """
+        if workers is None:
+            # pylint: disable=protected-access
+            workers = getattr(self.executor, '_max_workers', None) or os.cpu_count() or 1
+        futures = [self.executor.submit(_warmup_task, self.warmup_delay_s)
+                   for _ in range(workers)]
+        for fut in futures:
+            fut.result()
+        self._warm = True
+
+    def map(self, fn: Callable, *iterables: Iterable, timeout: Optional[float]=None,
+            chunksize: int=1) -> list:
+        """
+        Run ``fn`` over the iterables like ``Executor.map`` and measure the batch.
+
+        The measurement is appended to ``measurements``.
+
+        Parameters
+        ----------
+        fn : Callable
+            The function, which must be picklable for process pools.
+        *iterables : Iterable
+            The arguments.
+        timeout : float, optional
+            The timeout in seconds for all results.
+        chunksize : int, optional
+            The chunk size for process pools.
+
+        Returns
+        -------
+        list
+            The results, in order.
+        """
+        if not self._warm:
+            self.warm_up()
+        args = [list(it) for it in iterables]
+        start_uj = self.em.get_uj()
+        start_s = time.perf_counter()
+        results = list(self.executor.map(fn, *args, timeout=timeout, chunksize=chunksize))
+        end_uj = self.em.get_uj()
+        elapsed_s = time.perf_counter() - start_s
+        self.measurements.append(Measurement(end_uj - start_uj, elapsed_s, len(results)))
+        return results
+
+    @property
+    def last(self) -> Optional[Measurement]:
+        """Optional[Measurement]: The most recent measurement, or None."""
+        return self.measurements[-1] if self.measurements else None
+
+    def shutdown(self, wait: bool=True) -> None:
+        """
+        Shut down the executor.
+
+        Parameters
+        ----------
+        wait : bool, optional
+            Whether to wait for pending tasks.
+        """
+        self.executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
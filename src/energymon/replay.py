@@ -0,0 +1,267 @@
+"""
+An ``energymon`` backend that replays a recorded energy trace.
+
+A trace is a text file with one ``<timestamp_us> <uj>`` sample per line (whitespace- or
+comma-separated), with timestamps in microseconds.
+Header lines of the form ``# key: value`` record the original monitor's metadata:
+``source``, ``interval_us``, ``precision_uj``, and ``exclusive``.
+Other lines starting with ``#`` and blank lines are ignored.
+
+Traces are streamed from disk, so arbitrarily long traces can be replayed in constant memory.
+The replay clock is either real time (optionally accelerated), where a read returns the most
+recent sample as of the elapsed trace time, or stepped, where each read returns the next sample.
+Reads after the end of the trace fail with ``ENODATA``.
+"""
+from ctypes import CFUNCTYPE, c_size_t, c_void_p, cast, memmove, set_errno
+import errno
+import threading
+import time
+from typing import Callable, Dict, Optional, TextIO, Tuple
+from . import (
+    energymon,
+    energymon_init, energymon_read_total, energymon_finish, energymon_get_source,
+    energymon_get_interval, energymon_get_precision, energymon_is_exclusive
+)
+from .context import EnergyMon
+
+DEFAULT_SOURCE = 'Trace Replay'
+"""The source reported if the trace doesn't specify one."""
+
+# The energymon_get_source prototype uses c_char_p, which converts the buffer argument to a
+# Python bytes copy; use raw pointers and cast the callback to the struct field type.
+_energymon_get_source_raw = CFUNCTYPE(c_void_p, c_void_p, c_size_t, use_errno=True)
+
+def read_header(path: str) -> Dict[str, str]:
+    """
+    Read a trace's metadata header.
+
+    Parameters
+    ----------
+    path : str
+        The trace file path.
+
+    Returns
+    -------
+    Dict[str, str]
+        The metadata values, keyed by name.
+    """
+    meta = {}
+    with open(path, 'r') as trace:
+        for line in trace:
+            line = line.strip()
+            if not line:
+                continue
+            if not line.startswith('#'):
+                break
+            key, sep, value = line[1:].partition(':')
+            if sep:
+                meta[key.strip()] = value.strip()
+    return meta
+
+def _samples(trace: TextIO):
+    for line in trace:
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        ts_us, uj = line.replace(',', ' ').split()
+        yield int(ts_us), int(uj)
+
+
+class _Replay:
+    """Replay state shared by the native callbacks."""
+
+    def __init__(self, path: str, speed: float, stepped: bool, clock: Callable[[], float]):
+        self.path = path
+        self.speed = speed
+        self.stepped = stepped
+        self.clock = clock
+        meta = read_header(path)
+        self.source = meta.get('source', DEFAULT_SOURCE).encode()
+        self.interval_us = int(meta.get('interval_us', 1))
+        self.precision_uj = int(meta.get('precision_uj', 0))
+        self.exclusive = meta.get('exclusive', 'False').lower() in ('1', 'true')
+        self._lock = threading.Lock()
+        self._file = None # type: Optional[TextIO]
+        self._iter = None
+        self._cur = None # type: Optional[Tuple[int, int]]
+        self._next = None # type: Optional[Tuple[int, int]]
+        self._first_us = 0
+        self._start = 0.0
+
+    def init(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                raise OSError(errno.EBUSY, 'replay already initialized')
+            self._file = open(self.path, 'r')
+            self._iter = _samples(self._file)
+            self._cur = None
+            self._next = next(self._iter, None)
+            # the virtual clock starts at the first sample
+            self._first_us = self._next[0] if self._next is not None else 0
+            self._start = self.clock()
+
+    def finish(self) -> None:
+        with self._lock:
+            if self._file is None:
+                raise OSError(errno.EINVAL, 'replay not initialized')
+            self._file.close()
+            self._file = None
+            self._iter = None
+
+    def read(self) -> int:
+        with self._lock:
+            if self._file is None:
+                raise OSError(errno.EINVAL, 'replay not initialized')
+            if self.stepped:
+                if self._next is None:
+                    raise OSError(errno.ENODATA, 'end of trace')
+                self._cur = self._next
+                self._next = next(self._iter, None)
+                return self._cur[1]
+            now_us = self._first_us + (self.clock() - self._start) * self.speed * 1000000
+            while self._next is not None and self._next[0] <= now_us:
+                self._cur = self._next
+                self._next = next(self._iter, None)
+            if self._cur is None or \
+                    (self._next is None and now_us > self._cur[0] + self.interval_us):
+                raise OSError(errno.ENODATA, 'end of trace')
+            return self._cur[1]
+
+
+def get_energymon(path: str, speed: float=1.0, stepped: bool=False,
+                  clock: Callable[[], float]=time.monotonic) -> energymon:
+    """
+    Create an ``energymon`` that replays a trace and "get" it, but do not initialize it.
+
+    Initializing opens the trace and starts the replay clock; finishing closes the trace.
+    Reinitializing restarts the replay from the beginning.
+
+    Parameters
+    ----------
+    path : str
+        The trace file path.
+    speed : float, optional
+        The replay speed relative to real time, e.g., 10 to replay 10x faster.
+        Ignored if ``stepped``.
+    stepped : bool, optional
+        If True, each read returns the next sample, regardless of time.
+    clock : Callable[[], float], optional
+        The clock, in seconds, that drives the real-time replay.
+
+    Returns
+    -------
+    energymon
+        An uninitialized ``energymon`` instance.
+
+    Raises
+    ------
+    OSError
+        If the trace file cannot be opened.
+    ValueError
+        If ``speed`` is not positive or the header is malformed.
+    """
+    if speed <= 0:
+        raise ValueError('speed must be > 0')
+    replay = _Replay(path, speed, stepped, clock)
+
+    def _call(func, err_val):
+        try:
+            return func()
+        except OSError as err:
+            set_errno(err.errno or errno.EIO)
+        except Exception: # pylint: disable=broad-except
+            # exceptions can't propagate through native code
+            set_errno(errno.EIO)
+        return err_val
+
+    def _init(_):
+        return _call(lambda: replay.init() or 0, -1)
+
+    def _finish(_):
+        return _call(lambda: replay.finish() or 0, -1)
+
+    def _read(_):
+        return _call(replay.read, 0)
+
+    def _source(buf, buflen):
+        if not buf or not buflen:
+            set_errno(errno.EINVAL)
+            return None
+        data = replay.source[:buflen - 1] + b'\0'
+        memmove(buf, data, len(data))
+        return buf
+
+    em = energymon()
+    em.finit = energymon_init(_init)
+    em.fread = energymon_read_total(_read)
+    em.ffinish = energymon_finish(_finish)
+    em.fsource = cast(_energymon_get_source_raw(_source), energymon_get_source)
+    em.finterval = energymon_get_interval(lambda _: replay.interval_us)
+    em.fprecision = energymon_get_precision(lambda _: replay.precision_uj)
+    em.fexclusive = energymon_is_exclusive(lambda: int(replay.exclusive))
+    return em
+
+
+class ReplayEnergyMon(EnergyMon):
+    """
+    An ``EnergyMon`` that replays a recorded trace.
+
+    See ``get_energymon`` for the replay behavior.
+    """
+
+    # pylint: disable=super-init-not-called
+    def __init__(self, path: str, speed: float=1.0, stepped: bool=False,
+                 clock: Callable[[], float]=time.monotonic):
+        """
+        Create a new instance.
+
+        Parameters
+        ----------
+        path : str
+            The trace file path.
+        speed : float, optional
+            The replay speed relative to real time, e.g., 10 to replay 10x faster.
+            Ignored if ``stepped``.
+        stepped : bool, optional
+            If True, each read returns the next sample, regardless of time.
+        clock : Callable[[], float], optional
+            The clock, in seconds, that drives the real-time replay.
+        """
+        self._refcount = 0
+        self._ctx = get_energymon(path, speed=speed, stepped=stepped, clock=clock)
+
+
+def record(em, path: str, count: int, period_us: Optional[int]=None,
+           clock: Callable[[], float]=time.monotonic) -> None:
+    """
+    Record a trace from an initialized ``EnergyMon``, including its metadata.
+
+    Parameters
+    ----------
+    em : EnergyMon
+        The energy monitor to read, which must be initialized.
+    path : str
+        The trace file path.
+    count : int
+        The number of samples.
+    period_us : int, optional
+        The period between samples in microseconds, default: the refresh interval.
+    clock : Callable[[], float], optional
+        The clock, in seconds, used for timestamps.
+    """
+    interval_us = em.get_interval_us()
+    if period_us is None:
+        period_us = interval_us
+    with open(path, 'w') as trace:
+        trace.write('# source: ' + em.get_source() + '\n')
+        trace.write('# interval_us: ' + str(interval_us) + '\n')
+        trace.write('# precision_uj: ' + str(em.get_precision_uj()) + '\n')
+        trace.write('# exclusive: ' + str(em.is_exclusive()) + '\n')
+        next_s = clock()
+        for i in range(count):
+            if i:
+                next_s += period_us / 1000000
+                delay = next_s - clock()
+                if delay > 0:
+                    time.sleep(delay)
+            uj = em.get_uj()
+            trace.write(str(int(clock() * 1000000)) + ' ' + str(uj) + '\n')
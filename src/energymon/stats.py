@@ -0,0 +1,520 @@
+"""
+Streaming statistics over ``energymon`` samples with bounded memory.
+
+Moments (mean, variance, min, max) are tracked with Welford's algorithm and quantiles are
+estimated with a KLL sketch.
+All summaries can be merged and serialized to plain dictionaries (e.g., for JSON), so
+distributions computed in different processes or on different nodes can be combined without
+shipping raw samples.
+"""
+import math
+import random
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+class Moments:
+    """
+    Running count, mean, variance, minimum, and maximum using Welford's algorithm.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, value: float) -> None:
+        """
+        Add a value.
+
+        Parameters
+        ----------
+        value : float
+            The value to add.
+        """
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: 'Moments') -> None:
+        """
+        Merge another instance into this one (Chan et al.'s parallel algorithm).
+
+        Parameters
+        ----------
+        other : Moments
+            The instance to merge, which is not modified.
+        """
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self) -> float:
+        """float: The sample variance, or NaN if fewer than two values have been added."""
+        if self.count < 2:
+            return math.nan
+        return self.m2 / (self.count - 1)
+
+    @property
+    def stddev(self) -> float:
+        """float: The sample standard deviation, or NaN if fewer than two values have been added."""
+        return math.sqrt(self.variance)
+
+    def to_dict(self) -> dict:
+        """
+        Serialize to a dictionary of primitive types.
+
+        Returns
+        -------
+        dict
+            The serialized state.
+        """
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2,
+                'min': self.min if self.count else None,
+                'max': self.max if self.count else None}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> 'Moments':
+        """
+        Deserialize from a dictionary created by ``to_dict``.
+
+        Parameters
+        ----------
+        state : dict
+            The serialized state.
+
+        Returns
+        -------
+        Moments
+            A new instance.
+        """
+        moments = cls()
+        moments.count = state['count']
+        moments.mean = state['mean']
+        moments.m2 = state['m2']
+        if moments.count:
+            moments.min = state['min']
+            moments.max = state['max']
+        return moments
+
+
+class KLLSketch:
+    """
+    A mergeable quantile sketch (Karnin, Lang, and Liberty) with bounded memory.
+
+    Memory use grows only logarithmically with the number of values added; rank error is
+    approximately ``O(1/k)``.
+    """
+
+    def __init__(self, k: int=200, seed: Optional[int]=None):
+        """
+        Create a new instance.
+
+        Parameters
+        ----------
+        k : int, optional
+            The accuracy parameter (capacity of the top-level compactor).
+        seed : int, optional
+            Seed for the random compaction offsets, for reproducible results.
+        """
+        if k < 8:
+            raise ValueError('k must be >= 8')
+        self.k = k
+        self._rand = random.Random(seed)
+        self._compactors = [[]] # type: List[List[float]]
+        self._size = 0
+        self._max_size = 0
+        self._update_max_size()
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self._compactors) - level - 1
+        return int(math.ceil(self.k * (2 / 3) ** depth)) + 1
+
+    def _update_max_size(self) -> None:
+        self._max_size = sum(self._capacity(h) for h in range(len(self._compactors)))
+
+    def _grow(self) -> None:
+        self._compactors.append([])
+        self._update_max_size()
+
+    def _compress(self) -> None:
+        for level, compactor in enumerate(self._compactors):
+            if len(compactor) >= self._capacity(level):
+                if level + 1 >= len(self._compactors):
+                    self._grow()
+                compactor.sort()
+                # an odd item out stays behind so that total weight is preserved
+                keep = [compactor.pop()] if len(compactor) % 2 else []
+                offset = self._rand.getrandbits(1)
+                self._compactors[level + 1].extend(compactor[offset::2])
+                compactor[:] = keep
+                break
+        self._size = sum(len(c) for c in self._compactors)
+
+    def update(self, value: float) -> None:
+        """
+        Add a value.
+
+        Parameters
+        ----------
+        value : float
+            The value to add.
+        """
+        self._compactors[0].append(value)
+        self._size += 1
+        if self._size >= self._max_size:
+            self._compress()
+
+    def merge(self, other: 'KLLSketch') -> None:
+        """
+        Merge another sketch into this one.
+
+        Parameters
+        ----------
+        other : KLLSketch
+            The sketch to merge, which is not modified.
+        """
+        while len(self._compactors) < len(other._compactors):
+            self._grow()
+        for level, compactor in enumerate(other._compactors):
+            self._compactors[level].extend(compactor)
+        self._size = sum(len(c) for c in self._compactors)
+        while self._size >= self._max_size:
+            self._compress()
+
+    @property
+    def count(self) -> int:
+        """int: The (weighted) number of values represented by the sketch."""
+        return sum(len(c) << level for level, c in enumerate(self._compactors))
+
+    def _weighted(self) -> List[Tuple[float, int]]:
+        items = [(v, 1 << level) for level, c in enumerate(self._compactors) for v in c]
+        items.sort()
+        return items
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile.
+
+        Parameters
+        ----------
+        q : float
+            The quantile, in the range ``[0, 1]``.
+
+        Returns
+        -------
+        float
+            The estimated value, or NaN if the sketch is empty.
+        """
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs: Sequence[float]) -> List[float]:
+        """
+        Estimate multiple quantiles, sorting the sketch only once.
+
+        Parameters
+        ----------
+        qs : Sequence[float]
+            The quantiles, each in the range ``[0, 1]``.
+
+        Returns
+        -------
+        List[float]
+            The estimated values, or NaNs if the sketch is empty.
+        """
+        for q in qs:
+            if not 0 <= q <= 1:
+                raise ValueError('quantile must be in range [0, 1]: ' + str(q))
+        items = self._weighted()
+        if not items:
+            return [math.nan for _ in qs]
+        total = sum(w for _, w in items)
+        results = []
+        for q in qs:
+            target = q * total
+            cumulative = 0
+            value = items[-1][0]
+            for item, weight in items:
+                cumulative += weight
+                if cumulative >= target:
+                    value = item
+                    break
+            results.append(value)
+        return results
+
+    def rank(self, value: float) -> float:
+        """
+        Estimate the normalized rank of a value, i.e., the fraction of values ``<= value``.
+
+        Parameters
+        ----------
+        value : float
+            The value.
+
+        Returns
+        -------
+        float
+            The estimated rank in the range ``[0, 1]``, or NaN if the sketch is empty.
+        """
+        total = self.count
+        if total == 0:
+            return math.nan
+        below = sum(sum(1 for v in c if v <= value) << level
+                    for level, c in enumerate(self._compactors))
+        return below / total
+
+    def to_dict(self) -> dict:
+        """
+        Serialize to a dictionary of primitive types.
+
+        Returns
+        -------
+        dict
+            The serialized state.
+        """
+        return {'k': self.k, 'compactors': [list(c) for c in self._compactors]}
+
+    @classmethod
+    def from_dict(cls, state: dict, seed: Optional[int]=None) -> 'KLLSketch':
+        """
+        Deserialize from a dictionary created by ``to_dict``.
+
+        Parameters
+        ----------
+        state : dict
+            The serialized state.
+        seed : int, optional
+            Seed for the random compaction offsets.
+
+        Returns
+        -------
+        KLLSketch
+            A new instance.
+        """
+        sketch = cls(k=state['k'], seed=seed)
+        sketch._compactors = [list(c) for c in state['compactors']] or [[]]
+        sketch._size = sum(len(c) for c in sketch._compactors)
+        sketch._update_max_size()
+        return sketch
+
+
+class PowerStats:
+    """
+    Streaming power statistics (in Watts) computed from successive energy readings.
+
+    Each pair of consecutive samples contributes one power value to the summaries.
+    Intervals with a non-positive time delta or a decreasing energy counter (e.g., after a
+    monitor is reset) are skipped.
+    """
+
+    def __init__(self, k: int=200, seed: Optional[int]=None):
+        """
+        Create a new instance.
+
+        Parameters
+        ----------
+        k : int, optional
+            The accuracy parameter for the quantile sketch.
+        seed : int, optional
+            Seed for the quantile sketch, for reproducible results.
+        """
+        self.moments = Moments()
+        self.sketch = KLLSketch(k=k, seed=seed)
+        self.energy_uj = 0
+        self.duration_s = 0.0
+        self._last = None # type: Optional[Tuple[int, float]]
+
+    def update(self, uj: int, timestamp_s: float) -> Optional[float]:
+        """
+        Add an energy reading.
+
+        Parameters
+        ----------
+        uj : int
+            The total energy in microjoules.
+        timestamp_s : float
+            The time of the reading in seconds, e.g., from ``time.monotonic()``.
+
+        Returns
+        -------
+        Optional[float]
+            The power in Watts over the interval since the previous reading, or None if the
+            interval was skipped or this is the first reading.
+        """
+        last = self._last
+        self._last = (uj, timestamp_s)
+        if last is None:
+            return None
+        d_uj = uj - last[0]
+        d_s = timestamp_s - last[1]
+        if d_s <= 0 or d_uj < 0:
+            return None
+        watts = d_uj / d_s / 1000000
+        self.energy_uj += d_uj
+        self.duration_s += d_s
+        self.moments.update(watts)
+        self.sketch.update(watts)
+        return watts
+
+    def sample(self, em) -> Optional[float]:
+        """
+        Read an initialized ``EnergyMon`` (or any object with a ``get_uj()`` method) and add the
+        reading, timestamped with ``time.monotonic()``.
+
+        Parameters
+        ----------
+        em : EnergyMon
+            The energy monitor to read.
+
+        Returns
+        -------
+        Optional[float]
+            The result of ``update``.
+        """
+        uj = em.get_uj()
+        return self.update(uj, time.monotonic())
+
+    def reset_interval(self) -> None:
+        """
+        Forget the previous reading, e.g., before resuming after a pause that should not be
+        included in the statistics.
+        """
+        self._last = None
+
+    @property
+    def count(self) -> int:
+        """int: The number of power values."""
+        return self.moments.count
+
+    @property
+    def mean_w(self) -> float:
+        """float: The mean of the power values in Watts."""
+        return self.moments.mean if self.moments.count else math.nan
+
+    @property
+    def average_w(self) -> float:
+        """float: The time-weighted average power in Watts (total energy / total duration)."""
+        if self.duration_s <= 0:
+            return math.nan
+        return self.energy_uj / self.duration_s / 1000000
+
+    @property
+    def variance(self) -> float:
+        """float: The sample variance of the power values."""
+        return self.moments.variance
+
+    @property
+    def peak_w(self) -> float:
+        """float: The peak power value in Watts."""
+        return self.moments.max if self.moments.count else math.nan
+
+    def percentile(self, p: float) -> float:
+        """
+        Estimate a power percentile.
+
+        Parameters
+        ----------
+        p : float
+            The percentile, in the range ``[0, 100]``.
+
+        Returns
+        -------
+        float
+            The estimated power in Watts.
+        """
+        return self.sketch.quantile(p / 100)
+
+    def summary(self, percentiles: Sequence[float]=(50, 95, 99)) -> Dict[str, float]:
+        """
+        Get a summary of the statistics.
+
+        Parameters
+        ----------
+        percentiles : Sequence[float], optional
+            The percentiles to estimate, each in the range ``[0, 100]``.
+
+        Returns
+        -------
+        Dict[str, float]
+            Values keyed by name, e.g., ``'mean_w'``, ``'p95_w'``.
+        """
+        result = {
+            'count': self.count,
+            'energy_uj': self.energy_uj,
+            'duration_s': self.duration_s,
+            'average_w': self.average_w,
+            'mean_w': self.mean_w,
+            'variance': self.variance,
+            'peak_w': self.peak_w,
+        }
+        for p, val in zip(percentiles, self.sketch.quantiles([p / 100 for p in percentiles])):
+            result['p' + format(p, 'g') + '_w'] = val
+        return result
+
+    def merge(self, other: 'PowerStats') -> None:
+        """
+        Merge statistics from another instance, e.g., from another process or node.
+
+        Parameters
+        ----------
+        other : PowerStats
+            The instance to merge, which is not modified.
+        """
+        self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+        self.energy_uj += other.energy_uj
+        self.duration_s += other.duration_s
+
+    def to_dict(self) -> dict:
+        """
+        Serialize to a dictionary of primitive types.
+        The previous reading is not included.
+
+        Returns
+        -------
+        dict
+            The serialized state.
+        """
+        return {'moments': self.moments.to_dict(), 'sketch': self.sketch.to_dict(),
+                'energy_uj': self.energy_uj, 'duration_s': self.duration_s}
+
+    @classmethod
+    def from_dict(cls, state: dict, seed: Optional[int]=None) -> 'PowerStats':
+        """
+        Deserialize from a dictionary created by ``to_dict``.
+
+        Parameters
+        ----------
+        state : dict
+            The serialized state.
+        seed : int, optional
+            Seed for the quantile sketch.
+
+        Returns
+        -------
+        PowerStats
+            A new instance.
+        """
+        stats = cls(seed=seed)
+        stats.moments = Moments.from_dict(state['moments'])
+        stats.sketch = KLLSketch.from_dict(state['sketch'], seed=seed)
+        stats.energy_uj = state['energy_uj']
+        stats.duration_s = state['duration_s']
+        return stats
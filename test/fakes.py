@@ -0,0 +1,9 @@
+# pylint: disable=C0114, C0116
+class FakeClock:
+    """A manually-advanced clock: set ``now`` (in seconds) to move time."""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
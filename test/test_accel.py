@@ -0,0 +1,129 @@
+# pylint: disable=C0114, C0116
+from array import array
+import ctypes
+import errno
+import timeit
+import unittest
+from energymon import accel, energymon, energymon_read_total, util
+
+def failing_energymon(fail_at):
+    """An energymon whose reads return 1, 2, ... but fail with EBUSY on read ``fail_at``."""
+    count = [0]
+    def fread(_):
+        count[0] += 1
+        if count[0] == fail_at:
+            ctypes.set_errno(errno.EBUSY)
+            return 0
+        return count[0]
+    enm = energymon()
+    enm.fread = energymon_read_total(fread)
+    return enm
+
+class TestAccelFallback(unittest.TestCase):
+    """Test accelerated reads using the pure-ctypes fallback."""
+
+    def setUp(self):
+        self._speedups = accel._speedups
+        accel._speedups = self.speedups()
+        self.enm = util.get_energymon(util.load_energymon_library())
+        util.init(self.enm)
+
+    def tearDown(self):
+        util.finish(self.enm)
+        accel._speedups = self._speedups
+
+    def speedups(self):
+        return None
+
+    def test_read_uj(self):
+        ret = accel.read_uj(self.enm)
+        self.assertIsInstance(ret, int)
+        self.assertTrue(ret >= 0)
+
+    def test_read_uj_unget(self):
+        with self.assertRaises(ValueError):
+            accel.read_uj(energymon())
+
+    def test_sample_uj(self):
+        buf = array('Q', bytes(8 * 5))
+        timestamps = array('q', bytes(8 * 5))
+        self.assertEqual(accel.sample_uj(self.enm, buf, period_us=100, timestamps=timestamps), 5)
+        self.assertTrue(all(val >= 0 for val in buf))
+        self.assertEqual(list(timestamps), sorted(timestamps))
+        # with the target period, the samples span at least 4 periods
+        self.assertGreaterEqual(timestamps[-1] - timestamps[0], 4 * 100000)
+
+    def test_read_error(self):
+        enm = failing_energymon(2)
+        self.assertEqual(accel.read_uj(enm), 1)
+        with self.assertRaises(OSError) as ctx:
+            accel.read_uj(enm)
+        self.assertEqual(ctx.exception.errno, errno.EBUSY)
+        with self.assertRaises(OSError):
+            accel.read_many_uj([failing_energymon(1)])
+
+    def test_sample_uj_error(self):
+        buf = array('Q', bytes(8 * 5))
+        with self.assertRaises(OSError):
+            accel.sample_uj(failing_energymon(3), buf)
+        self.assertEqual(list(buf), [1, 2, 0, 0, 0])
+
+    def test_sample_uj_bytearray(self):
+        self.assertEqual(accel.sample_uj(self.enm, bytearray(24)), 3)
+
+    def test_sample_uj_bad_buffers(self):
+        with self.assertRaises(ValueError):
+            accel.sample_uj(self.enm, bytearray(7))
+        with self.assertRaises(ValueError):
+            accel.sample_uj(self.enm, bytearray(16), timestamps=bytearray(8))
+        with self.assertRaises(TypeError):
+            accel.sample_uj(self.enm, bytes(16))
+
+    def test_read_many_uj(self):
+        enm2 = util.get_energymon(util.load_energymon_library())
+        util.init(enm2)
+        try:
+            vals = accel.read_many_uj([self.enm, enm2])
+        finally:
+            util.finish(enm2)
+        self.assertEqual(len(vals), 2)
+        self.assertTrue(all(isinstance(val, int) for val in vals))
+        self.assertEqual(accel.read_many_uj([]), [])
+
+    def test_reader(self):
+        reader = accel.Reader(self.enm)
+        self.assertIsInstance(reader.read(), int)
+        self.assertEqual(reader.sample(bytearray(24)), 3)
+        enm = failing_energymon(2)
+        reader = accel.Reader(enm)
+        self.assertEqual(reader.read(), 1)
+        with self.assertRaises(OSError):
+            reader.read()
+        with self.assertRaises(ValueError):
+            accel.Reader(energymon())
+
+    def test_multi_reader(self):
+        reader = accel.MultiReader([failing_energymon(0), failing_energymon(0)])
+        self.assertEqual(reader.read(), [1, 1])
+        self.assertEqual(reader.read(), [2, 2])
+        self.assertEqual(accel.MultiReader([]).read(), [])
+        with self.assertRaises(OSError):
+            accel.MultiReader([failing_energymon(0), failing_energymon(1)]).read()
+
+
+@unittest.skipUnless(accel.AVAILABLE, 'accelerator not built')
+class TestAccelCompiled(TestAccelFallback):
+    """Test accelerated reads using the compiled accelerator."""
+
+    def speedups(self):
+        return self._speedups
+
+    def test_reader_faster(self):
+        reader = accel.Reader(self.enm)
+        fast = min(timeit.repeat(reader.read, number=10000, repeat=5))
+        slow = min(timeit.repeat(lambda: util.get_uj(self.enm), number=10000, repeat=5))
+        self.assertLess(fast, slow / 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
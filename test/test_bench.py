@@ -0,0 +1,54 @@
+# pylint: disable=C0114, C0116
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from energymon import bench
+
+class TestBench(unittest.TestCase):
+    """Test the scaling benchmark."""
+
+    def test_sweep(self):
+        results = bench.sweep(levels=(1, 3), reads=50)
+        self.assertEqual([(r['mode'], r['level']) for r in results],
+                         [(m, l) for m in bench.MODES for l in (1, 3)])
+        for res in results:
+            self.assertEqual(res['reads'], 50 * res['level'])
+            self.assertEqual(res['lost'], 0)
+            self.assertEqual(res['duplicates'], 0)
+            self.assertGreater(res['throughput_rps'], 0)
+            self.assertLessEqual(res['p50_us'], res['p99_us'])
+        table = bench.format_table(results)
+        self.assertEqual(len(table.splitlines()), len(results) + 1)
+
+    def test_real_backend(self):
+        backend = bench.Backend('energymon-default', 'energymon_get_default', None)
+        res = bench.run_level('threads', 2, 10, backend)
+        self.assertEqual(res['reads'], 20)
+        self.assertIsNone(res['lost'])
+        self.assertIsNone(res['duplicates'])
+
+    def test_bad(self):
+        backend = bench.Backend('energymon-default', 'energymon_get_default', None)
+        with self.assertRaises(ValueError):
+            bench.run_level('fibers', 1, 1, backend)
+        with self.assertRaises(ValueError):
+            bench.run_level('threads', 0, 1, backend)
+
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'results.json')
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                ret = bench.main(['--modes', 'threads,asyncio', '--levels', '1,2', '--reads', '20',
+                                  '--json', path])
+            self.assertEqual(ret, 0)
+            self.assertIn('scaling', out.getvalue())
+            with open(path) as results:
+                self.assertEqual(len(json.load(results)), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
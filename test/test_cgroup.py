@@ -0,0 +1,178 @@
+# pylint: disable=C0114, C0116
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from energymon.cgroup import CgroupEnergyEstimator, parse_cpu_stat, parse_proc_cpu_stat, \
+    parse_proc_stat
+from energymon.replay import ReplayEnergyMon
+from .fakes import FakeClock
+
+CPU_STAT = 'usage_usec {}\nuser_usec 0\nsystem_usec 0\n'
+NODE_STAT = 'cpu  {} 0 0 99999 0 0 0 7 0 0\ncpu0 0 0 0 0 0 0 0 0 0 0\nintr 0\n'
+PROC_STAT = '{} (my (odd) cmd) S 1 1 1 0 -1 4194304 0 0 0 0 {} {} 0 0 20 0 1 0 0 0 0\n'
+
+class TestCgroupEnergyEstimator(unittest.TestCase):
+    """Test CgroupEnergyEstimator against a fake cgroup tree and a replayed trace."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cgroup_root = os.path.join(self.tmpdir.name, 'cgroup')
+        self.proc_root = os.path.join(self.tmpdir.name, 'proc')
+        self.trace = os.path.join(self.tmpdir.name, 'trace.txt')
+        with open(self.trace, 'w') as trace:
+            for i, uj in enumerate([0, 10000000, 20000000, 30000000]):
+                trace.write('{} {}\n'.format(i * 1000000, uj))
+        self.clock = FakeClock()
+        self.write_node(0)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_cgroup(self, name, usage_us):
+        path = os.path.join(self.cgroup_root, name)
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, 'cpu.stat'), 'w') as cpu_stat:
+            cpu_stat.write(CPU_STAT.format(usage_us))
+
+    def write_node(self, busy_us):
+        os.makedirs(self.proc_root, exist_ok=True)
+        with open(os.path.join(self.proc_root, 'stat'), 'w') as stat:
+            stat.write(NODE_STAT.format(busy_us * os.sysconf('SC_CLK_TCK') // 1000000))
+
+    def estimator(self, enm, **kwargs):
+        return CgroupEnergyEstimator(enm, cgroup_root=self.cgroup_root, proc_root=self.proc_root,
+                                     clock=self.clock, **kwargs)
+
+    def write_proc(self, pid, utime, stime):
+        path = os.path.join(self.proc_root, str(pid))
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, 'stat'), 'w') as stat:
+            stat.write(PROC_STAT.format(pid, utime, stime))
+
+    def test_parse(self):
+        self.assertEqual(parse_cpu_stat(CPU_STAT.format(123).encode()), 123)
+        self.assertEqual(parse_cpu_stat(b'usage_usec 5'), 5)
+        with self.assertRaises(ValueError):
+            parse_cpu_stat(b'user_usec 5\n')
+        self.assertEqual(parse_proc_stat(PROC_STAT.format(1, 100, 50).encode(), 100), 1500000)
+        self.assertEqual(parse_proc_cpu_stat(NODE_STAT.format(100).encode(), 100), 1000000)
+        with self.assertRaises(ValueError):
+            parse_proc_cpu_stat(b'intr 0\n', 100)
+
+    def test_tick(self):
+        self.write_cgroup('a', 0)
+        self.write_cgroup('b/c', 0)
+        with ReplayEnergyMon(self.trace, stepped=True) as enm, \
+                self.estimator(enm, cgroups=['a', 'b/c'], idle_power_w=2.0) as est:
+            self.assertIsNone(est.tick())
+            self.write_cgroup('a', 300000)
+            self.write_cgroup('b/c', 100000)
+            self.write_node(400000)
+            self.clock.now = 1.0
+            tick = est.tick()
+            self.assertEqual(tick.interval_s, 1.0)
+            self.assertEqual(tick.energy_uj, 10000000)
+            self.assertEqual(tick.idle_uj, 2000000)
+            self.assertEqual(tick.unattributed_uj, 0)
+            self.assertEqual(tick.shares, {'a': 6000000, 'b/c': 2000000})
+            # no CPU usage - nothing attributed
+            self.clock.now = 2.0
+            tick = est.tick()
+            self.assertEqual(tick.shares, {'a': 0, 'b/c': 0})
+            self.assertEqual(tick.unattributed_uj, 8000000)
+            self.write_cgroup('a', 400000)
+            self.write_node(500000)
+            self.clock.now = 3.0
+            tick = est.tick()
+            self.assertEqual(tick.shares, {'a': 8000000, 'b/c': 0})
+            self.assertEqual(tick.removed, [])
+            self.assertEqual(est.totals['a'], 14000000)
+
+    def test_untracked(self):
+        self.write_cgroup('a', 0)
+        self.write_proc(10, 0, 0)
+        with ReplayEnergyMon(self.trace, stepped=True) as enm, \
+                self.estimator(enm, cgroups=['a']) as est:
+            est.tick()
+            # the node is busy, mostly with untracked work
+            self.write_cgroup('a', 10000)
+            self.write_node(1000000)
+            self.clock.now = 1.0
+            tick = est.tick()
+            self.assertEqual(tick.shares, {'a': 100000})
+            self.assertEqual(tick.unattributed_uj, 9900000)
+            # a tracked process in the tracked cgroup isn't double-counted in the denominator
+            est.add_pid(10)
+            est.tick()
+            self.write_cgroup('a', 210000)
+            self.write_proc(10, 10, 0)
+            self.write_node(1400000)
+            self.clock.now = 3.0
+            tick = est.tick()
+            self.assertEqual(tick.shares, {'a': 5000000, 10: 2500000})
+            self.assertEqual(tick.unattributed_uj, 2500000)
+
+    def test_node_usage_lag(self):
+        self.write_cgroup('a', 0)
+        with ReplayEnergyMon(self.trace, stepped=True) as enm, \
+                self.estimator(enm, cgroups=['a']) as est:
+            est.tick()
+            # tick granularity in /proc/stat - never charge more than the dynamic energy
+            self.write_cgroup('a', 15000)
+            self.write_node(10000)
+            self.clock.now = 1.0
+            tick = est.tick()
+            self.assertEqual(tick.shares, {'a': 10000000})
+            self.assertEqual(tick.unattributed_uj, 0)
+
+    def test_removed(self):
+        self.write_cgroup('a', 0)
+        with ReplayEnergyMon(self.trace, stepped=True) as enm, \
+                self.estimator(enm, cgroups=['a']) as est:
+            est.tick()
+            est.remove('a')
+            self.assertEqual(est.tracked, [])
+            with self.assertRaises(KeyError):
+                est.remove('a')
+        with self.assertRaises(ValueError):
+            est.tick()
+
+    def test_pids(self):
+        self.write_proc(10, 0, 0)
+        self.write_proc(20, 0, 0)
+        with ReplayEnergyMon(self.trace, stepped=True) as enm, \
+                self.estimator(enm, pids=[10, 20]) as est:
+            self.assertIsNone(est.tick())
+            self.write_proc(10, 1, 2)
+            self.write_proc(20, 1, 0)
+            self.write_node(40000)
+            self.clock.now = 1.0
+            tick = est.tick()
+            self.assertEqual(tick.shares, {10: 7500000, 20: 2500000})
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'requires Linux procfs')
+    def test_exited_pid(self):
+        proc = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+        try:
+            with ReplayEnergyMon(self.trace, stepped=True) as enm, \
+                    CgroupEnergyEstimator(enm, pids=[proc.pid]) as est:
+                est.tick()
+                proc.kill()
+                proc.wait()
+                tick = est.tick()
+                self.assertEqual(tick.removed, [proc.pid])
+                self.assertEqual(est.tracked, [])
+        finally:
+            proc.kill()
+            proc.wait()
+
+    def test_missing(self):
+        with ReplayEnergyMon(self.trace, stepped=True) as enm:
+            with self.assertRaises(FileNotFoundError):
+                self.estimator(enm, cgroups=['missing'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+# pylint: disable=C0114, C0116
+import json
+import os
+import tempfile
+import unittest
+from energymon import discovery
+from energymon.context import EnergyMon
+from energymon.discovery import ProbeResult
+
+BAD = ('!@#$%^&*()', 'energymon_get_default')
+DEFAULT = ('energymon-default', 'energymon_get_default')
+
+class TestDiscovery(unittest.TestCase):
+    """Test discovery."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmpdir.name, 'sub', 'discovery.json')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_fingerprint(self):
+        self.assertEqual(discovery.host_fingerprint(), discovery.host_fingerprint())
+
+    def test_probe(self):
+        result = discovery.probe(*DEFAULT)
+        self.assertTrue(result.ok)
+        self.assertIsInstance(result.source, str)
+        self.assertIsInstance(result.latency_s, float)
+
+    def test_probe_bad(self):
+        result = discovery.probe(*BAD)
+        self.assertFalse(result.ok)
+        self.assertIn('FileNotFoundError', result.error)
+
+    def test_rank(self):
+        results = [
+            ProbeResult('a', 'f', False, 'err', None, None, None, None),
+            ProbeResult('b', 'f', True, None, 's', 1000, 0, 0.1),
+            ProbeResult('c', 'f', True, None, 's', 1000, 10, 0.1),
+            ProbeResult('d', 'f', True, None, 's', 100, 10, 0.1),
+            ProbeResult('e', 'f', True, None, 's', 100, 10, 0.01),
+        ]
+        self.assertEqual([r.lib for r in discovery.rank(results)], ['e', 'd', 'c', 'b', 'a'])
+
+    def test_probe_all(self):
+        results = discovery.probe_all([BAD, DEFAULT])
+        self.assertEqual([(r.lib, r.ok) for r in results], [(DEFAULT[0], True), (BAD[0], False)])
+
+    def track_probes(self):
+        probed = []
+        probe = discovery._probe
+        def _probe(*args):
+            out = probe(*args)
+            probed.append(out)
+            return out
+        discovery._probe = _probe
+        self.addCleanup(setattr, discovery, '_probe', probe)
+        return probed
+
+    def test_discover(self):
+        probed = self.track_probes()
+        enm = discovery.discover([BAD, DEFAULT, DEFAULT], cache_path=self.cache_path)
+        try:
+            self.assertIsInstance(enm, EnergyMon)
+            self.assertTrue(enm.initialized)
+            # the winning probe's monitor is returned, the others are finished
+            self.assertEqual(len(probed), 3)
+            ems = [em for _, em in probed if em is not None]
+            self.assertEqual(len(ems), 2)
+            self.assertIn(enm, ems)
+            self.assertEqual([em.initialized for em in ems].count(True), 1)
+        finally:
+            enm.finish()
+        with open(self.cache_path) as cache:
+            data = json.load(cache)
+        self.assertEqual(data[discovery.host_fingerprint()],
+                         {'lib': DEFAULT[0], 'func_get': DEFAULT[1]})
+        # cached decision is used without probing
+        enm = discovery.discover([BAD, DEFAULT], cache_path=self.cache_path)
+        try:
+            self.assertTrue(enm.initialized)
+            self.assertEqual(len(probed), 3)
+        finally:
+            enm.finish()
+
+    def test_discover_stale_cache(self):
+        os.makedirs(os.path.dirname(self.cache_path))
+        with open(self.cache_path, 'w') as cache:
+            json.dump({discovery.host_fingerprint(): {'lib': BAD[0], 'func_get': BAD[1]}}, cache)
+        enm = discovery.discover([BAD, DEFAULT], cache_path=self.cache_path)
+        self.assertTrue(enm.initialized)
+        enm.finish()
+        with open(self.cache_path) as cache:
+            self.assertEqual(json.load(cache)[discovery.host_fingerprint()]['lib'], DEFAULT[0])
+
+    def test_discover_none(self):
+        with self.assertRaises(OSError):
+            discovery.discover([BAD], use_cache=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
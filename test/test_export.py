@@ -0,0 +1,66 @@
+# pylint: disable=C0114, C0116
+import os
+import tempfile
+import unittest
+from energymon.context import EnergyMon
+from energymon.export import ENERGY_COLUMN, TIMESTAMP_COLUMN, ParquetExporter, TraceBuffer
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+class TestTraceBuffer(unittest.TestCase):
+    """Test TraceBuffer."""
+
+    def test_append_take(self):
+        buf = TraceBuffer()
+        for i in range(10):
+            buf.append(i * 1000, i)
+        self.assertEqual(len(buf), 10)
+        ts_buf, uj_buf = buf.take()
+        self.assertEqual(len(buf), 0)
+        self.assertEqual(list(ts_buf), [i * 1000 for i in range(10)])
+        self.assertEqual(list(uj_buf), list(range(10)))
+        self.assertEqual(uj_buf.itemsize, 8)
+
+    def test_sample(self):
+        buf = TraceBuffer()
+        with EnergyMon() as enm:
+            self.assertIsInstance(buf.sample(enm), int)
+        self.assertEqual(len(buf), 1)
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow not installed')
+    def test_record_batch(self):
+        buf = TraceBuffer()
+        for i in range(10):
+            buf.append(i * 1000, i)
+        batch = buf.to_record_batch({'source': 'test'})
+        self.assertEqual(len(buf), 0)
+        self.assertEqual(batch.num_rows, 10)
+        self.assertEqual(batch.column(batch.schema.get_field_index(ENERGY_COLUMN)).to_pylist(),
+                         list(range(10)))
+        self.assertEqual(batch.schema.metadata[b'source'], b'test')
+
+
+@unittest.skipIf(pyarrow is None, 'pyarrow not installed')
+class TestParquetExporter(unittest.TestCase):
+    """Test ParquetExporter."""
+
+    def test_rolling(self):
+        with tempfile.TemporaryDirectory() as tmpdir, EnergyMon() as enm:
+            with ParquetExporter(enm, tmpdir, rows_per_file=10, batch_rows=5) as exporter:
+                for _ in range(23):
+                    exporter.sample()
+            files = exporter.files
+            self.assertEqual(len(files), 3)
+            self.assertTrue(all(os.path.exists(f) for f in files))
+            tables = [pyarrow.parquet.read_table(f) for f in files]
+            self.assertEqual([t.num_rows for t in tables], [10, 10, 3])
+            self.assertEqual(tables[0].column_names, [TIMESTAMP_COLUMN, ENERGY_COLUMN])
+            self.assertEqual(tables[0].schema.metadata[b'source'], enm.get_source().encode())
+
+
+if __name__ == '__main__':
+    unittest.main()
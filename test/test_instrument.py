@@ -0,0 +1,83 @@
+# pylint: disable=C0114, C0116
+import unittest
+from energymon import energymon, instrument, util
+from energymon.context import EnergyMon
+
+class TestInstrument(unittest.TestCase):
+    """Test instrumentation."""
+
+    def setUp(self):
+        instrument.reset()
+
+    def tearDown(self):
+        instrument.disable()
+        instrument.reset()
+
+    def test_disabled(self):
+        get_uj = util.get_uj
+        instrument.enable()
+        self.assertTrue(instrument.is_enabled())
+        self.assertIsNot(util.get_uj, get_uj)
+        instrument.disable()
+        self.assertFalse(instrument.is_enabled())
+        self.assertIs(util.get_uj, get_uj)
+        with EnergyMon() as enm:
+            enm.get_uj()
+        self.assertEqual(instrument.snapshot()['calls'], {})
+
+    def test_enable_idempotent(self):
+        get_uj = util.get_uj
+        instrument.enable()
+        instrument.enable()
+        instrument.disable()
+        self.assertIs(util.get_uj, get_uj)
+
+    def test_counts(self):
+        instrument.enable()
+        with EnergyMon() as enm:
+            for _ in range(10):
+                enm.get_uj()
+        calls = instrument.snapshot()['calls']
+        self.assertEqual(calls['EnergyMon.get_uj']['count'], 10)
+        self.assertEqual(calls['util.get_uj']['count'], 10)
+        self.assertEqual(sum(calls['util.get_uj']['buckets']), 10)
+        self.assertEqual(calls['util.init']['count'], 1)
+        self.assertEqual(calls['util.finish']['count'], 1)
+        self.assertGreater(instrument.percentile_ns(calls['util.get_uj']['buckets'], 99), 0)
+        names = [name for _, name, _ in instrument.events()]
+        self.assertIn('EnergyMon.__enter__', names)
+        self.assertIn('util.finish', names)
+
+    def test_errors(self):
+        instrument.enable()
+        with self.assertRaises(ValueError):
+            util.get_uj(energymon())
+        with self.assertRaises(FileNotFoundError):
+            util.load_energymon_library('!@#$%^&*()')
+        calls = instrument.snapshot()['calls']
+        self.assertEqual(calls['util.get_uj']['errors'], 1)
+        self.assertEqual(calls['util.get_uj']['errnos'], {})
+        self.assertEqual(calls['util.load_energymon_library']['errors'], 1)
+
+    def test_hooks(self):
+        seen = []
+        def hook(name, elapsed_ns, error):
+            seen.append((name, elapsed_ns, error))
+        instrument.add_hook(hook)
+        try:
+            instrument.enable()
+            enm = util.get_energymon(util.load_energymon_library())
+            util.init(enm)
+            util.finish(enm)
+        finally:
+            instrument.remove_hook(hook)
+        self.assertEqual([s[0] for s in seen],
+                         ['util.load_energymon_library', 'util.get_energymon', 'util.init',
+                          'util.finish'])
+        self.assertTrue(all(s[2] is None for s in seen))
+        with self.assertRaises(ValueError):
+            instrument.remove_hook(hook)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,231 @@
+# pylint: disable=C0114, C0116
+import errno
+import threading
+import time
+import unittest
+from energymon.context import EnergyMon
+from energymon.policy import CircuitBreaker, GuardedReader, Reading, RetryPolicy
+from .fakes import FakeClock
+
+class FakeMon:
+    """Fails with the given errnos (None for success) in order, then succeeds."""
+
+    def __init__(self, errnos=(), block=None, interval_block=None, delay_s=0):
+        self.errnos = list(errnos)
+        self.block = block
+        self.delay_s = delay_s
+        self.interval_block = interval_block
+        self.reads = 0
+
+    def get_uj(self):
+        self.reads += 1
+        if self.block is not None:
+            self.block.wait()
+        time.sleep(self.delay_s)
+        err = self.errnos.pop(0) if self.errnos else None
+        if err is not None:
+            raise OSError(err, 'fake')
+        return self.reads * 1000
+
+    def get_interval_us(self):
+        if self.interval_block is not None:
+            self.interval_block.wait()
+        return 100
+
+
+class TestRetryPolicy(unittest.TestCase):
+    """Test RetryPolicy."""
+
+    def test_bad(self):
+        with self.assertRaises(ValueError):
+            RetryPolicy(max_attempts=0)
+
+    def test_retry(self):
+        fake = FakeMon([errno.EAGAIN, errno.EBUSY])
+        reader = GuardedReader(fake, retry=RetryPolicy(max_attempts=3), seed=0)
+        self.assertEqual(reader.get_uj(), Reading(3000, False))
+
+    def test_exhausted(self):
+        fake = FakeMon([errno.EAGAIN] * 3)
+        reader = GuardedReader(fake, retry=RetryPolicy(max_attempts=2))
+        with self.assertRaises(OSError):
+            reader.get_uj()
+        self.assertEqual(fake.reads, 2)
+
+    def test_not_transient(self):
+        fake = FakeMon([errno.EIO])
+        reader = GuardedReader(fake, retry=RetryPolicy())
+        with self.assertRaises(OSError):
+            reader.get_uj()
+        self.assertEqual(fake.reads, 1)
+
+    def test_stale(self):
+        fake = FakeMon([None, errno.EIO])
+        reader = GuardedReader(fake, retry=RetryPolicy())
+        self.assertEqual(reader.get_uj(), Reading(1000, False))
+        self.assertEqual(reader.get_uj(), Reading(1000, True))
+        self.assertEqual(reader.get_uj(), Reading(3000, False))
+
+    def test_delay(self):
+        policy = RetryPolicy(max_delay_us=1000)
+        reader = GuardedReader(FakeMon(), seed=0)
+        for attempt in range(1, 10):
+            delay = policy.delay_s(attempt, 100, reader._rand)
+            self.assertLessEqual(delay, 0.001)
+            self.assertGreaterEqual(delay, min(0.001, 0.0001 * 2 ** (attempt - 1)) / 2)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test CircuitBreaker."""
+
+    def test_states(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout_s=1.0, clock=clock)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+        clock.now = 1.0
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow())
+        # only one trial
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        clock.now = 2.0
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_reader(self):
+        clock = FakeClock()
+        fake = FakeMon([None, errno.EIO, errno.EIO])
+        breaker = CircuitBreaker(failure_threshold=2, clock=clock)
+        reader = GuardedReader(fake, breaker=breaker)
+        self.assertEqual(reader.get_uj(), Reading(1000, False))
+        self.assertEqual(reader.get_uj(), Reading(1000, True))
+        self.assertEqual(reader.get_uj(), Reading(1000, True))
+        # open - sensor is not read
+        self.assertEqual(reader.get_uj(), Reading(1000, True))
+        self.assertEqual(fake.reads, 3)
+        clock.now = 1.0
+        self.assertEqual(reader.get_uj(), Reading(4000, False))
+
+    def test_open_no_last(self):
+        breaker = CircuitBreaker(failure_threshold=1)
+        reader = GuardedReader(FakeMon([errno.EIO]), breaker=breaker)
+        with self.assertRaises(OSError):
+            reader.get_uj()
+        with self.assertRaises(OSError) as ctx:
+            reader.get_uj()
+        self.assertEqual(ctx.exception.errno, errno.EAGAIN)
+
+
+class TestGuardedReader(unittest.TestCase):
+    """Test GuardedReader."""
+
+    def test_timeout(self):
+        block = threading.Event()
+        fake = FakeMon(block=block)
+        reader = GuardedReader(fake, timeout_s=0.01)
+        try:
+            with self.assertRaises(TimeoutError):
+                reader.get_uj()
+            # hung read is not queued behind
+            with self.assertRaises(TimeoutError):
+                reader.get_uj()
+            self.assertEqual(fake.reads, 1)
+            block.set()
+            reader._hung.result()
+            self.assertEqual(reader.get_uj(), Reading(2000, False))
+        finally:
+            block.set()
+            reader.close()
+
+    def test_concurrent_slow_reads(self):
+        fake = FakeMon(delay_s=0.02)
+        reader = GuardedReader(fake, breaker=CircuitBreaker(failure_threshold=1), timeout_s=1.0)
+        readings = []
+        barrier = threading.Barrier(2)
+        def _read():
+            barrier.wait()
+            readings.append(reader.get_uj())
+        threads = [threading.Thread(target=_read) for _ in range(2)]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            reader.close()
+        # the second caller waits for the first read rather than timing out
+        self.assertEqual(sorted(readings), [Reading(1000, False), Reading(2000, False)])
+        self.assertEqual(reader.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_queued_timeout(self):
+        block = threading.Event()
+        fake = FakeMon(block=block)
+        reader = GuardedReader(fake, timeout_s=0.05)
+        try:
+            errors = []
+            def _read():
+                try:
+                    reader.get_uj()
+                except TimeoutError as err:
+                    errors.append(err)
+            thread = threading.Thread(target=_read)
+            thread.start()
+            while not fake.reads:
+                time.sleep(0.001)
+            # queued behind the blocked read, then dropped when its own deadline passes
+            with self.assertRaises(TimeoutError):
+                reader.get_uj()
+            block.set()
+            thread.join()
+            # the blocked read overran its deadline too
+            self.assertEqual(len(errors), 1)
+            reader._hung.result()
+            self.assertEqual(fake.reads, 1)
+        finally:
+            block.set()
+            reader.close()
+
+    def test_native_timeout_retried(self):
+        retry = RetryPolicy(base_delay_us=1, retry_errnos=(errno.ETIMEDOUT,))
+        for timeout_s in (None, 1.0):
+            fake = FakeMon([errno.ETIMEDOUT])
+            reader = GuardedReader(fake, retry=retry, timeout_s=timeout_s)
+            try:
+                self.assertEqual(reader.get_uj(), Reading(2000, False))
+            finally:
+                reader.close()
+
+    def test_interval_timeout(self):
+        block = threading.Event()
+        fake = FakeMon([errno.EAGAIN], interval_block=block)
+        reader = GuardedReader(fake, retry=RetryPolicy(), timeout_s=0.05)
+        try:
+            start = time.monotonic()
+            with self.assertRaises(TimeoutError):
+                reader.get_uj()
+            self.assertLess(time.monotonic() - start, 1.0)
+        finally:
+            block.set()
+            reader.close()
+
+    def test_energymon(self):
+        with EnergyMon() as enm:
+            reader = GuardedReader(enm, retry=RetryPolicy(), breaker=CircuitBreaker(),
+                                   timeout_s=1.0)
+            try:
+                reading = reader.get_uj()
+            finally:
+                reader.close()
+        self.assertFalse(reading.stale)
+        self.assertIsInstance(reading.uj, int)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+# pylint: disable=C0114, C0116
+import ctypes
+import errno
+import gc
+import unittest
+import warnings
+from energymon import energymon_read_total, pool, util
+from energymon.context import EnergyMon
+from energymon.pool import EnergyMonPool
+from .fakes import FakeClock
+
+def _fail_read(_):
+    ctypes.set_errno(errno.EIO)
+    return 0
+
+
+class TestEnergyMonPool(unittest.TestCase):
+    """Test EnergyMonPool."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.pool = EnergyMonPool(max_size=2, idle_timeout_s=10, clock=self.clock)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_bad(self):
+        with self.assertRaises(ValueError):
+            EnergyMonPool(max_size=-1)
+
+    def test_reuse(self):
+        with self.pool.checkout() as enm:
+            self.assertIsInstance(enm, EnergyMon)
+            self.assertTrue(enm.initialized)
+            enm.get_uj()
+        self.assertTrue(enm.initialized)
+        self.assertEqual(self.pool.size, 1)
+        self.assertEqual(self.pool.idle, 1)
+        with self.pool.checkout() as enm2:
+            self.assertIs(enm2, enm)
+            self.assertEqual(self.pool.idle, 0)
+
+    def test_concurrent_checkouts(self):
+        with self.pool.checkout() as enm1, self.pool.checkout() as enm2, \
+                self.pool.checkout() as enm3:
+            self.assertEqual(len({id(enm1), id(enm2), id(enm3)}), 3)
+            self.assertEqual(self.pool.size, 2)
+        # the overflow monitor is not retained
+        self.assertFalse(enm3.initialized)
+        self.assertEqual(self.pool.idle, 2)
+
+    def test_idle_timeout(self):
+        with self.pool.checkout() as enm:
+            pass
+        self.clock.now = 5
+        self.assertEqual(self.pool.reap(), 0)
+        self.clock.now = 10
+        self.assertEqual(self.pool.reap(), 1)
+        self.assertFalse(enm.initialized)
+        self.assertEqual(self.pool.size, 0)
+
+    def test_evict_lru(self):
+        with self.pool.checkout() as enm1, self.pool.checkout() as enm2:
+            pass
+        self.clock.now = 1
+        # a different key
+        with self.pool.checkout(lib=util.load_energymon_library()) as enm3:
+            self.assertTrue(enm3.initialized)
+        self.assertEqual(self.pool.size, 2)
+        # one of the two idle default monitors was evicted
+        self.assertEqual(sum(e.initialized for e in (enm1, enm2)), 1)
+
+    def test_health_check(self):
+        with self.pool.checkout() as enm:
+            pass
+        enm._ctx.fread = energymon_read_total(_fail_read)
+        with self.pool.checkout() as enm2:
+            self.assertIsNot(enm2, enm)
+        self.assertFalse(enm.initialized)
+        self.assertEqual(self.pool.size, 1)
+
+    def test_health_check_other_error(self):
+        with self.pool.checkout() as enm:
+            pass
+        def fail():
+            raise RuntimeError('fail')
+        enm.get_uj = fail
+        with self.assertRaises(RuntimeError):
+            self.pool.acquire()
+        self.assertFalse(enm.initialized)
+        self.assertEqual(self.pool.size, 0)
+        self.assertEqual(self.pool.idle, 0)
+
+    def test_lazy_expiry(self):
+        with self.pool.checkout() as enm1:
+            pass
+        self.clock.now = 8
+        with self.pool.checkout(lib=util.load_energymon_library()) as enm2:
+            pass
+        self.clock.now = 12
+        # only the first has expired
+        self.assertEqual(self.pool.reap(), 1)
+        self.assertFalse(enm1.initialized)
+        self.assertTrue(enm2.initialized)
+        self.clock.now = 17
+        self.assertEqual(self.pool.reap(), 0)
+        self.clock.now = 18
+        self.assertEqual(self.pool.reap(), 1)
+        self.assertFalse(enm2.initialized)
+
+    def test_garbage_collected(self):
+        tmp_pool = EnergyMonPool()
+        with tmp_pool.checkout() as enm:
+            pass
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            del tmp_pool
+            gc.collect()
+        self.assertFalse(enm.initialized)
+        self.assertEqual([w for w in caught if issubclass(w.category, ResourceWarning)], [])
+
+    def test_discard_on_error(self):
+        with self.assertRaises(OSError):
+            with self.pool.checkout() as enm:
+                raise OSError(errno.EIO, 'fail')
+        self.assertFalse(enm.initialized)
+        self.assertEqual(self.pool.size, 0)
+        with self.assertRaises(ValueError):
+            self.pool.release(enm)
+
+    def test_close(self):
+        with self.pool.checkout() as enm1:
+            enm2 = self.pool.acquire()
+        self.pool.close()
+        self.assertFalse(enm1.initialized)
+        self.assertTrue(enm2.initialized)
+        self.pool.release(enm2)
+        self.assertFalse(enm2.initialized)
+        self.assertEqual(self.pool.size, 0)
+        with self.assertRaises(ValueError):
+            self.pool.acquire()
+
+    def test_default_pool(self):
+        self.assertIs(pool.default_pool(), pool.default_pool())
+        with pool.checkout() as enm:
+            self.assertTrue(enm.initialized)
+
+
+if __name__ == '__main__':
+    unittest.main()
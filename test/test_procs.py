@@ -0,0 +1,80 @@
+# pylint: disable=C0114, C0116
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from energymon.procs import MeasuredExecutor, measured_run
+from energymon.replay import ReplayEnergyMon
+
+def square(val):
+    return val * val
+
+def sleep_square(val):
+    time.sleep(0.02)
+    return val * val
+
+
+class TestProcs(unittest.TestCase):
+    """Test subprocess and executor measurement against a replayed 1 W trace."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        trace = os.path.join(self.tmpdir.name, 'trace.txt')
+        with open(trace, 'w') as out:
+            out.write('# interval_us: 1000\n')
+            for ms in range(30000):
+                out.write('{} {}\n'.format(ms * 1000, ms * 1000))
+        self.enm = ReplayEnergyMon(trace)
+        self.enm.init()
+
+    def tearDown(self):
+        self.enm.finish()
+        self.tmpdir.cleanup()
+
+    def test_measured_run(self):
+        run = measured_run(self.enm, [sys.executable, '-c', 'import time; time.sleep(0.1)'])
+        self.assertEqual(run.completed.returncode, 0)
+        self.assertGreater(run.elapsed_s, 0.1)
+        # 1 W
+        self.assertAlmostEqual(run.energy_uj / 1000000, run.elapsed_s, delta=0.01)
+
+    def test_measured_run_output(self):
+        run = measured_run(self.enm, [sys.executable, '-c', 'import sys; print(sys.stdin.read())'],
+                           input=b'hello', capture_output=True)
+        self.assertEqual(run.completed.stdout.strip(), b'hello')
+        self.assertGreaterEqual(run.energy_uj, 0)
+
+    def test_measured_run_check(self):
+        with self.assertRaises(subprocess.CalledProcessError):
+            measured_run(self.enm, [sys.executable, '-c', 'exit(1)'], check=True)
+        self.assertEqual(measured_run(self.enm, [sys.executable, '-c', 'exit(1)'])
+                         .completed.returncode, 1)
+
+    def test_measured_run_timeout(self):
+        with self.assertRaises(subprocess.TimeoutExpired):
+            measured_run(self.enm, [sys.executable, '-c', 'import time; time.sleep(10)'],
+                         timeout=0.1)
+
+    def test_thread_executor(self):
+        with MeasuredExecutor(ThreadPoolExecutor(2), self.enm) as mexec:
+            self.assertEqual(mexec.map(sleep_square, range(4)), [0, 1, 4, 9])
+            self.assertEqual(mexec.map(square, [3]), [9])
+        self.assertEqual(len(mexec.measurements), 2)
+        first = mexec.measurements[0]
+        self.assertEqual(first.tasks, 4)
+        self.assertGreaterEqual(first.elapsed_s, 0.04)
+        self.assertAlmostEqual(first.energy_uj / 1000000, first.elapsed_s, delta=0.01)
+        self.assertEqual(mexec.last.tasks, 1)
+
+    def test_process_executor(self):
+        with MeasuredExecutor(ProcessPoolExecutor(2), self.enm) as mexec:
+            self.assertEqual(mexec.map(square, range(10), chunksize=2), [i * i for i in range(10)])
+        self.assertEqual(mexec.last.tasks, 10)
+        self.assertGreaterEqual(mexec.last.energy_uj, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
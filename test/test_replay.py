@@ -0,0 +1,111 @@
+# pylint: disable=C0114, C0116
+import errno
+import os
+import tempfile
+import unittest
+from energymon import replay, util
+from energymon.context import EnergyMon
+from energymon.replay import ReplayEnergyMon
+from .fakes import FakeClock
+
+TRACE = """# source: Test Source
+# interval_us: 1000
+# precision_uj: 10
+# exclusive: True
+1000000 100
+1001000,200
+
+# comment
+1002000 300
+"""
+
+class TestReplay(unittest.TestCase):
+    """Test trace replay."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'trace.txt')
+        with open(self.path, 'w') as trace:
+            trace.write(TRACE)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_header(self):
+        self.assertEqual(replay.read_header(self.path),
+                         {'source': 'Test Source', 'interval_us': '1000', 'precision_uj': '10',
+                          'exclusive': 'True'})
+
+    def test_util(self):
+        enm = replay.get_energymon(self.path, stepped=True)
+        self.assertEqual(util.get_source(enm), 'Test Source')
+        self.assertEqual(util.get_source(enm, maxlen=5), 'Test')
+        self.assertTrue(util.is_exclusive(enm))
+        util.init(enm)
+        try:
+            self.assertEqual(util.get_interval_us(enm), 1000)
+            self.assertEqual(util.get_precision_uj(enm), 10)
+            self.assertEqual([util.get_uj(enm) for _ in range(3)], [100, 200, 300])
+            with self.assertRaises(OSError) as ctx:
+                util.get_uj(enm)
+            self.assertEqual(ctx.exception.errno, errno.ENODATA)
+        finally:
+            util.finish(enm)
+        with self.assertRaises(OSError):
+            util.finish(enm)
+
+    def test_defaults(self):
+        with open(self.path, 'w') as trace:
+            trace.write('0 0\n')
+        with ReplayEnergyMon(self.path) as enm:
+            self.assertEqual(enm.get_source(), replay.DEFAULT_SOURCE)
+            self.assertEqual(enm.get_interval_us(), 1)
+            self.assertEqual(enm.get_precision_uj(), 0)
+            self.assertFalse(enm.is_exclusive())
+
+    def test_real_time(self):
+        clock = FakeClock(50.0)
+        enm = ReplayEnergyMon(self.path, speed=2, clock=clock)
+        with enm:
+            self.assertEqual(enm.get_uj(), 100)
+            clock.now += 0.0004
+            self.assertEqual(enm.get_uj(), 100)
+            clock.now += 0.00015
+            self.assertEqual(enm.get_uj(), 200)
+            clock.now += 0.0005
+            self.assertEqual(enm.get_uj(), 300)
+            clock.now += 0.0003
+            self.assertEqual(enm.get_uj(), 300)
+            clock.now += 0.0002
+            with self.assertRaises(OSError):
+                enm.get_uj()
+        # restarts on reinit
+        with enm:
+            self.assertEqual(enm.get_uj(), 100)
+
+    def test_bad_speed(self):
+        with self.assertRaises(ValueError):
+            ReplayEnergyMon(self.path, speed=0)
+
+    def test_missing(self):
+        with self.assertRaises(FileNotFoundError):
+            ReplayEnergyMon(os.path.join(self.tmpdir.name, 'missing.txt'))
+
+    def test_record(self):
+        path = os.path.join(self.tmpdir.name, 'recorded.txt')
+        with ReplayEnergyMon(self.path, stepped=True) as enm:
+            replay.record(enm, path, 3, period_us=1)
+        self.assertEqual(replay.read_header(path), replay.read_header(self.path))
+        with ReplayEnergyMon(path, stepped=True) as enm:
+            self.assertEqual([enm.get_uj() for _ in range(3)], [100, 200, 300])
+
+    def test_record_energymon(self):
+        path = os.path.join(self.tmpdir.name, 'recorded.txt')
+        with EnergyMon() as enm:
+            replay.record(enm, path, 2, period_us=1)
+            source = enm.get_source()
+        self.assertEqual(ReplayEnergyMon(path).get_source(), source)
+
+
+if __name__ == '__main__':
+    unittest.main()
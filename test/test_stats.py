@@ -0,0 +1,130 @@
+# pylint: disable=C0114, C0116
+import json
+import math
+import random
+import statistics
+import unittest
+from energymon.context import EnergyMon
+from energymon.stats import KLLSketch, Moments, PowerStats
+
+class TestMoments(unittest.TestCase):
+    """Test Moments."""
+
+    def test_empty(self):
+        mom = Moments()
+        self.assertEqual(mom.count, 0)
+        self.assertTrue(math.isnan(mom.variance))
+
+    def test_update(self):
+        values = [random.uniform(0, 100) for _ in range(1000)]
+        mom = Moments()
+        for val in values:
+            mom.update(val)
+        self.assertEqual(mom.count, len(values))
+        self.assertAlmostEqual(mom.mean, statistics.mean(values))
+        self.assertAlmostEqual(mom.variance, statistics.variance(values))
+        self.assertEqual(mom.min, min(values))
+        self.assertEqual(mom.max, max(values))
+
+    def test_merge(self):
+        values = [random.uniform(0, 100) for _ in range(1000)]
+        mom1 = Moments()
+        mom2 = Moments()
+        for val in values[:300]:
+            mom1.update(val)
+        for val in values[300:]:
+            mom2.update(val)
+        mom1.merge(mom2)
+        self.assertEqual(mom1.count, len(values))
+        self.assertAlmostEqual(mom1.mean, statistics.mean(values))
+        self.assertAlmostEqual(mom1.variance, statistics.variance(values))
+        self.assertEqual(mom1.max, max(values))
+
+    def test_serialize(self):
+        mom = Moments()
+        self.assertEqual(Moments.from_dict(json.loads(json.dumps(mom.to_dict()))).count, 0)
+        for val in range(10):
+            mom.update(val)
+        mom2 = Moments.from_dict(json.loads(json.dumps(mom.to_dict())))
+        self.assertEqual(mom2.to_dict(), mom.to_dict())
+
+
+class TestKLLSketch(unittest.TestCase):
+    """Test KLLSketch."""
+
+    def test_bad_k(self):
+        with self.assertRaises(ValueError):
+            KLLSketch(k=1)
+
+    def test_empty(self):
+        self.assertTrue(math.isnan(KLLSketch().quantile(0.5)))
+
+    def test_bad_quantile(self):
+        with self.assertRaises(ValueError):
+            KLLSketch().quantile(1.5)
+
+    def test_quantiles(self):
+        sketch = KLLSketch(seed=0)
+        n = 100000
+        for val in random.Random(0).sample(range(n), n):
+            sketch.update(val)
+        self.assertEqual(sketch.count, n)
+        # memory is bounded
+        self.assertLess(sum(len(c) for c in sketch._compactors), 2000)
+        for q in (0.5, 0.95, 0.99):
+            self.assertAlmostEqual(sketch.quantile(q) / n, q, delta=0.02)
+        self.assertAlmostEqual(sketch.rank(n / 2), 0.5, delta=0.02)
+
+    def test_merge(self):
+        sketches = [KLLSketch(seed=i) for i in range(4)]
+        n = 40000
+        for val in range(n):
+            sketches[val % 4].update(val)
+        merged = KLLSketch(seed=0)
+        for sketch in sketches:
+            merged.merge(KLLSketch.from_dict(json.loads(json.dumps(sketch.to_dict()))))
+        self.assertEqual(merged.count, n)
+        self.assertAlmostEqual(merged.quantile(0.5) / n, 0.5, delta=0.02)
+
+
+class TestPowerStats(unittest.TestCase):
+    """Test PowerStats."""
+
+    def test_update(self):
+        stats = PowerStats(seed=0)
+        self.assertIsNone(stats.update(0, 0.0))
+        self.assertEqual(stats.update(2000000, 1.0), 2.0)
+        self.assertEqual(stats.update(6000000, 2.0), 4.0)
+        # skipped intervals
+        self.assertIsNone(stats.update(6000000, 2.0))
+        self.assertIsNone(stats.update(0, 3.0))
+        self.assertEqual(stats.count, 2)
+        self.assertEqual(stats.energy_uj, 6000000)
+        self.assertEqual(stats.average_w, 3.0)
+        self.assertEqual(stats.peak_w, 4.0)
+        summary = stats.summary()
+        self.assertEqual(summary['mean_w'], 3.0)
+        self.assertIn('p99_w', summary)
+
+    def test_merge_serialize(self):
+        stats1 = PowerStats(seed=0)
+        stats2 = PowerStats(seed=1)
+        for i in range(100):
+            stats1.update(i * 1000000, float(i))
+            stats2.update(i * 3000000, float(i))
+        merged = PowerStats.from_dict(json.loads(json.dumps(stats1.to_dict())))
+        merged.merge(PowerStats.from_dict(stats2.to_dict()))
+        self.assertEqual(merged.count, 198)
+        self.assertEqual(merged.peak_w, 3.0)
+        self.assertAlmostEqual(merged.average_w, 2.0)
+
+    def test_sample(self):
+        stats = PowerStats()
+        with EnergyMon() as enm:
+            stats.sample(enm)
+            stats.sample(enm)
+        self.assertLessEqual(stats.count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()